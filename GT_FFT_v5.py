@@ -1,5 +1,7 @@
 
 import os
+import queue
+import itertools
 import cmath
 import ctypes
 import resource
@@ -16,10 +18,18 @@ import urllib.error
 ============================================
 """
 
-from metrics.fft_iterativa import start_fft
-from utils.load_data import load_sensor
-from utils.get_peak_resolution import get_top_peaks_resolution
-from utils.get_peak_prominence import get_top_peaks_prominence
+from metrics.fft_iterativa import resolve_backend, warm_up
+from metrics.welch_stream import StreamingWelch
+from metrics.analysis import build_job, run_analysis
+from utils import acq_binary
+from utils.stream_writer import StreamWriterManager
+from utils.acq_buffer import AcquisitionBuffer
+from utils.analysis_executor import AnalysisExecutor
+from utils.upload_worker import UploadWorker
+from utils.upload_journal import UploadJournal
+from utils.device_config import DeviceConfigManager
+from utils.history_logger import HistoryLogger
+from utils.frame_capture import CaptureWriter
 
 from utils.ftp_manager import FTPClient
 # from utils.influxdb_manager import InfluxHandler
@@ -34,9 +44,19 @@ from protocol_radio import XBeeManager
 class Gateway:
     # --- COSTANTI DI CLASSE ---
     DATA_DIR =  '/etc/config/scripts/SHM_Data/'
+    CONFIG_PATH = '/etc/config/scripts/gw_config.json'
 
     # Inizializzazione della classe Gateway().
-    def __init__(self):
+    def __init__(self, config_path=CONFIG_PATH, xbee=None, shard=None, clock=datetime.now):
+        """
+            Params:
+                - config_path: file di configurazione del gateway
+                - xbee: radio gia' istanziata (default XBeeManager), es. gateway_shards.ProxyRadio
+                - shard: (indice, numero di shard) se il gateway e' un worker della modalita' sharded
+                - clock: ora di ricezione dei frame (self.t: nomi dei file, history.log), default
+                  datetime.now; nel replay l'ora registrata nella cattura
+        """
+        self.clock = clock
         
         # 1. dizionari di stato
         self.device_dict = {}                               #chi e' online?
@@ -54,15 +74,29 @@ class Gateway:
         self.open_file_dict = {}                           #file aperti
         self.pack_num_dict = {}                             #numero pacchetto atteso
         self.first_data_dict = {}                           #baseline accellerometro
+        self.stream_writer = StreamWriterManager()          #handle bufferizzati per sensore
+        self.acq_buffer_dict = {}                           #acquisizione in memoria per FFT
+        self.welch_dict = {}                                #PSD di Welch in streaming
+        
+        self.upload_batches = {}                            #invii in corso: batch -> sensore e sink in attesa
+        self.upload_results = queue.Queue()                 #esiti dei worker di upload
+        self._batch_ids = itertools.count(1)
         
         # 4. variabilli di servizio
+        self.history_logger = None                          #logger bufferizzato (dopo il caricamento config)
         self.original_payload = None
         self.delay = 0
         self.delay_time = 2
+        self.delay_step = self.delay_time                   #incremento del delay a ogni nuovo sensore
         self.t = datetime.now()
+        self.running = True
+        self.shard = shard
 
         # 5. caricamento config
-        self.load_gateway_config()
+        self.load_gateway_config(config_path)
+        if shard is not None:
+            self._apply_shard(*shard)
+        self.history_logger = HistoryLogger(self.logger_file, flush_interval=self.history_flush_interval)
 
         # 6. istanziazione handler
         self.ftp_handler = FTPClient(
@@ -70,7 +104,9 @@ class Gateway:
             user=self.username,
             pwd=self.pwd,
             path=self.server_path,
-            local_dir = self.DATA_DIR
+            local_dir = self.DATA_DIR,
+            keepalive=self.ftp_keepalive,
+            idle_timeout=self.ftp_idle_timeout
         )
         
         # self.influx_handler = InfluxHandler(
@@ -80,10 +116,38 @@ class Gateway:
         # )
 
         self.fastapi_handler = FastAPIHandler(
-            url = self.fastapi_url
+            url = self.fastapi_url,
+            batch = self.fastapi_batch,
+            batch_url = self.fastapi_batch_url,
+            batch_max = self.fastapi_batch_max,
+            samples_encoding = self.fastapi_samples_encoding
         )
+
+        # pool di processi per FFT e picchi (None = analisi nel loop principale)
+        self.analysis_executor = None
+        if self.analysis_workers > 0:
+            self.analysis_executor = AnalysisExecutor(self.analysis_workers, self.analysis_timeout)
+        # worker di upload (un thread per sink), esiti raccolti in collect_uploads
+        self.upload_workers = {
+            'fastapi': UploadWorker('fastapi', self._upload_fastapi, self.upload_results, self.upload_background,
+                                    batch_fn=self._upload_fastapi_batch if self.fastapi_batch else None),
+            'ftp': UploadWorker('ftp', self._upload_ftp, self.upload_results, self.upload_background),
+        }
+
+        # config.txt ricaricato solo se modificato, pacchetti 0xA2 precalcolati
+        self.device_config = DeviceConfigManager(self.config_file)
+        self.config_dict = self.device_config.configs
+
+        # code di upload ricostruite dal registro persistente (file in attesa prima del riavvio)
+        self.upload_journal = UploadJournal(self.upload_journal_file)
+        self._restore_upload_queues()
+
         # 7. creo istanza modulo di connessione radio con i sensori
-        self.xbee = XBeeManager(timeout=5)
+        self.capture = None                                 # registrazione dei frame per il replay
+        if xbee is None and self.capture_file:
+            self.capture = CaptureWriter(self.capture_file, max_mb=self.capture_max_mb)
+        self.xbee = xbee if xbee is not None else XBeeManager(timeout=5, queue_size=self.radio_queue_size,
+                                                              capture=self.capture)
 
 
     def run(self):
@@ -92,25 +156,196 @@ class Gateway:
             self.xbee.start(self.append_history)
             self.append_history(f"--- Gateway Start: {datetime.now()} ---\n\n")
 
-            # reset file sensori
-            with open(self.device_file, 'w+') as f:
-                pass
+            # reset file sensori (in modalita' sharded lo azzera il processo radio)
+            if self.shard is None:
+                with open(self.device_file, 'w+') as f:
+                    pass
+
+            if self.fft_warmup:
+                self.warm_up_fft()
 
             # LOOP principale di ascolto
-            while True:
+            while self.running:
                 self.main()
 
         except Exception as e:
             self.append_history(f"ERRORE CRITICO ESECUZIONE: {e}\n")
         finally:
+            self.stream_writer.close_all()
+            if self.analysis_executor is not None:
+                self.analysis_executor.shutdown()
+            for worker in self.upload_workers.values():
+                worker.stop()
+            self.ftp_handler.close()
+            self.fastapi_handler.close()
             self.xbee.stop(self.append_history)
+            if self.capture is not None:
+                self.capture.close()
+            self.history_logger.close()                 # ultimo: scarica anche i log di chiusura
+
+    def stop(self):
+        """ Termina il loop principale dopo il giro corrente (chiusure nel finally di run) """
+        self.running = False
 
     # HELPER FUNCTIONS
+    def _apply_shard(self, index, count):
+        """
+            Worker della modalita' sharded (gateway_shards.py): il processo gestisce solo i sensori
+            con crc32(MAC) % count == index.
+            - history.log e registro upload separati per processo (history_shard<i>.log, ...)
+            - delay dei nuovi sensori intercalati tra i processi (index*2, index*2 + count*2, ...)
+              per non assegnare lo stesso delay a sensori di shard diversi
+        """
+        self.logger_file = self._shard_path(self.logger_file, index)
+        self.upload_journal_file = self._shard_path(self.upload_journal_file, index)
+        self.delay = index * self.delay_time
+        self.delay_step = count * self.delay_time
+
+    @staticmethod
+    def _shard_path(path, index):
+        """ history.log -> history_shard<index>.log """
+        root, ext = os.path.splitext(path)
+        return f"{root}_shard{index}{ext}"
+
     def _background_upload_task(self, addr):
         """
-            Funzione che gira in parallelo, timeout di 120 secondi
-            senza bloccare la ricezione radio dei sensori
+            Accoda ai worker di upload (thread, timeout di 120 secondi) i file in attesa del sensore,
+            senza bloccare la ricezione radio dei sensori.
+            Le code vengono aggiornate da collect_uploads quando arrivano gli esiti,
+            il cleanup dei file locali quando hanno risposto tutti i sink del batch.
+        """
+        if any(batch['addr'] == addr for batch in self.upload_batches.values()):
+            self.append_history(f"\t[UPLOAD] Invio precedente per {addr} ancora in corso\n")
+            return
+
+        pending = {
+            'fastapi': self.file2s_fastapi_dict.get(addr, []),
+            'ftp': self.file2s_dict_ftp.get(addr, []),
+        }
+        sinks = [sink for sink, files in pending.items() if files]
+        if not sinks:
+            self._cleanup_uploaded(addr)
+            return
+
+        batch_id = next(self._batch_ids)
+        self.upload_batches[batch_id] = {'addr': addr, 'waiting': set(sinks)}
+        fft_result = dict(self.fft_dict.get(addr, {}))                  # fft_dict viene svuotato a fine A1
+        for sink in sinks:
+            self.upload_workers[sink].submit(batch_id, addr, pending[sink], fft_result)
+
+        self.collect_uploads()                                          # esiti gia' pronti (modalita' sincrona)
+
+
+    def _upload_fastapi(self, addr, files, fft_result, logger_callback):
+        """ Eseguito nel worker FastAPI """
+        return self.fastapi_handler.upload_file(
+            addr=addr,
+            files_to_send=files,
+            local_dir=self.DATA_DIR,
+            fft_result=fft_result,
+            logger_callback=logger_callback
+        )
+
+
+    def _upload_fastapi_batch(self, tasks, logger_callback):
+        """ Eseguito nel worker FastAPI: invii di piu' sensori accumulati, una richiesta batch """
+        pending = {addr: (files, fft_result) for _, addr, files, fft_result in tasks}
+        uploaded = self.fastapi_handler.upload_batch(pending, self.DATA_DIR, logger_callback)
+        return {batch_id: uploaded.get(addr, []) for batch_id, addr, _, _ in tasks}
+
+
+    def _upload_ftp(self, addr, files, fft_result, logger_callback):
+        """ Eseguito nel worker FTP """
+        return self.ftp_handler.upload_files(
+            addr=addr,
+            files_to_send=files,
+            logger_callback=logger_callback
+        )
+
+
+    def collect_uploads(self):
+        """
+            Svuota la coda degli esiti di upload (loop principale):
+            log, rimozione dalle code dei soli file inviati e cleanup a batch concluso
+        """
+        queues = {'fastapi': self.file2s_fastapi_dict, 'ftp': self.file2s_dict_ftp}
+        while True:
+            try:
+                sink, batch_id, addr, uploaded, logs = self.upload_results.get_nowait()
+            except queue.Empty:
+                break
+
+            for line in logs:
+                self.append_history(line)
+
+            pending = queues[sink].get(addr, [])
+            for file in uploaded:
+                if file in pending:
+                    pending.remove(file)
+                self.upload_journal.done(file, sink)
+
+            batch = self.upload_batches.get(batch_id)
+            if batch is None:
+                continue
+            batch['waiting'].discard(sink)
+            if not batch['waiting']:
+                self.upload_batches.pop(batch_id)
+                self._cleanup_uploaded(addr)
+
+
+    def _cleanup_uploaded(self, addr):
+        """
+            Cleanup: file rimosso solo se non e' in coda FTP e non e' uno stream ancora aperto.
+            I file del sensore arrivano dal registro (piu' quelli trovati all'avvio e non registrati),
+            senza scansione della cartella dati.
+        """
+        pending_ftp = self.file2s_dict_ftp.get(addr, [])
+        open_file = self.open_file_dict.get(addr)
+        candidates = self.upload_journal.files(addr)
+        candidates += [f for f in self._untracked_files if f.startswith(addr)]
+
+        for filename in candidates:
+            if filename not in pending_ftp and os.path.join(self.DATA_DIR, filename) != open_file:
+                try:
+                    if os.path.exists(os.path.join(self.DATA_DIR, filename)):
+                        os.remove(os.path.join(self.DATA_DIR, filename))
+                    self.upload_journal.forget(filename)
+                    self._untracked_files.discard(filename)
+                    if filename in self.file2s_fastapi_dict.get(addr, []):      # file non piu' disponibile
+                        self.file2s_fastapi_dict[addr].remove(filename)
+                except Exception as e:
+                    self.append_history(f"\t[ERROR] Cleanup fallito per {filename}: {str(e)}")
+
+
+    def _enqueue_upload(self, addr, filename, sinks):
+        """ Accoda il file per i sink indicati ("ftp", "fastapi"), in memoria e nel registro """
+        queues = {'fastapi': self.file2s_fastapi_dict, 'ftp': self.file2s_dict_ftp}
+        for sink in sinks:
+            queue_files = queues[sink].setdefault(addr, [])
+            if filename not in queue_files:
+                queue_files.append(filename)
+        self.upload_journal.add(addr, filename, sinks)
+
+
+    def _restore_upload_queues(self):
+        """
+            All'avvio: code ricostruite dal registro (esclusi i file non piu' su disco).
+            Unica scansione della cartella: i file di acquisizione non registrati vengono
+            rimossi al cleanup del relativo sensore, come in assenza di registro.
         """
+        files_on_disk = set(os.listdir(self.DATA_DIR))
+        for filename in self.upload_journal.tracked():
+            if filename not in files_on_disk:
+                self.upload_journal.forget(filename)
+
+        self.file2s_dict_ftp = self.upload_journal.pending('ftp')
+        self.file2s_fastapi_dict = self.upload_journal.pending('fastapi')
+
+        tracked = set(self.upload_journal.tracked())
+        self._untracked_files = {
+            f for f in files_on_disk if f.endswith((".log", acq_binary.BIN_EXT)) and f not in tracked
+        }
+
     def load_gateway_config(self, config_path = "/etc/config/scripts/gw_config.json"): 
         
         self.logger_file = '/etc/config/scripts/SHM_Data/history.log'           # percorso provvisorio per gestire errori iniziali
@@ -123,6 +358,9 @@ class Gateway:
                 self.username = config['ftp']['user']
                 self.pwd = config['ftp']['pwd']
                 self.server_path = config['ftp']['path']
+                # sessione FTP persistente: intervallo NOOP e chiusura per inattivita' (s)
+                self.ftp_keepalive = config['ftp'].get('keepalive', 60)
+                self.ftp_idle_timeout = config['ftp'].get('idle_timeout', 300)
                 
                 # parametri influx
                 # self.influx_url = config['influxdb']['url']
@@ -130,12 +368,52 @@ class Gateway:
 
                 # parametri fastapi
                 self.fastapi_url = config['fastapi']['url']
+                # invio di piu' file (anche di sensori diversi) in una sola richiesta
+                self.fastapi_batch = config['fastapi'].get('batch', False)
+                self.fastapi_batch_url = config['fastapi'].get('batch_url')
+                self.fastapi_batch_max = config['fastapi'].get('batch_max', 8)
+                # codifica dei campioni nel payload: "json" (lista di float), "f2"/"f4" (base64)
+                self.fastapi_samples_encoding = config['fastapi'].get('samples_encoding', 'json')
                 
                 # percorsi file e impostazioni gateway
                 self.logger_file = config['gateway']['logger_file']
                 self.device_file = config['gateway']['device_file']
                 self.config_file = config['gateway']['config_file']
+                # cartella dati (acquisizioni, registro upload), es. per il replay fuori dal gateway
+                self.DATA_DIR = os.path.join(config['gateway'].get('data_dir', self.DATA_DIR), '')
                 self.is_flexibile_structure = config['gateway'].get('is_flexibile_structure', True)
+                # formato file acquisizioni: "log" (testo) oppure "f2"/"f4" (binario, utils.acq_binary)
+                self.acq_format = config['gateway'].get('acq_format', 'log')
+                # backend FFT: "auto" (numpy se disponibile), "numpy", "python"
+                self.fft_backend = config['gateway'].get('fft_backend', 'auto')
+                self.fft_warmup = config['gateway'].get('fft_warmup', True)
+                # padding a potenza di 2: "auto" (strategia meno costosa), true, false
+                self.fft_padding = config['gateway'].get('fft_padding', 'auto')
+                # raffinamento sub-bin dei picchi (zoom della DTFT) riportato in fft_dict
+                self.peak_refine = config['gateway'].get('peak_refine', False)
+                # PSD di Welch durante la ricezione: lunghezza segmento (0 = disattivata)
+                self.welch_segment_len = config['gateway'].get('welch_segment_len', 0)
+                seg = self.welch_segment_len
+                if seg and (seg < 2 or seg & (seg - 1)):           # StreamingWelch fallirebbe a ogni D1
+                    self.append_history(f"\t[WARN] welch_segment_len {seg} non e' una potenza di 2: "
+                                        f"PSD di Welch disattivata\n")
+                    self.welch_segment_len = 0
+                # upload FastAPI/FTP in thread separati (false = invio nel loop principale)
+                self.upload_background = config['gateway'].get('upload_background', True)
+                # registro persistente delle code di upload
+                self.upload_journal_file = config['gateway'].get('upload_journal', self.DATA_DIR + 'upload_journal.jsonl')
+                # history.log bufferizzato: intervallo di scrittura su disco (s), 0 = scrittura immediata
+                self.history_flush_interval = config['gateway'].get('history_flush_interval', 1.0)
+                # thread di lettura radio: dimensione della coda dei frame (0 = lettura nel loop principale)
+                self.radio_queue_size = config['gateway'].get('radio_queue_size', 512)
+                # registrazione dei frame ricevuti per il replay (protocol_replay.py), None = disattivata
+                self.capture_file = config['gateway'].get('capture_file')
+                self.capture_max_mb = config['gateway'].get('capture_max_mb', 64)
+                # processi dedicati a FFT e picchi (0 = nel loop principale) e timeout per job (s)
+                self.analysis_workers = config['gateway'].get('analysis_workers', 0)
+                self.analysis_timeout = config['gateway'].get('analysis_timeout', 60)
+                # attesa massima (s) delle analisi di un sensore al suo A1, a loop radio fermo
+                self.analysis_sync_wait = config['gateway'].get('analysis_sync_wait', 2.0)
                 
                 print("Configurazione caricata con successo")
         except Exception as e: 
@@ -155,7 +433,7 @@ class Gateway:
                 is_append: True => append al file esistente; False => crea un nuovo file (default False)
 
             Returns:
-                acq_data: (list(str)) campioni decodificati
+                acq_data: (list(float)) campioni decodificati
             Raises:
                 errori loggati tramite append_history()
 
@@ -165,18 +443,26 @@ class Gateway:
         """
         
         try:
-            # 1. decodifica
-            acq_data = ProtocolDecoder.decode_samples(payload_slice, first_value)
+            # 1. decodifica (numerica, la formattazione avviene solo in scrittura)
+            acq_data = ProtocolDecoder.decode_samples_bulk(payload_slice, first_value)
 
-            # 2. scrivo nel file(se esiste un file aperto per il dispositivo)
-            if addr in self.open_file_dict and os.path.exists(self.open_file_dict[addr]):
+            # 2. scrivo nel file(se esiste uno stream aperto per il dispositivo)
+            if addr in self.open_file_dict and self.stream_writer.is_open(addr):
                 file_path = self.open_file_dict[addr]
-                mode = 'a' if is_append else 'w+'                       #append o scrivi nuovo
 
                 try:
-                    with open(file_path, mode) as f:
-                        for d in acq_data:
-                            f.write(d + ';')
+                    if not is_append:                                   #riscrivo da capo
+                        self.stream_writer.open(addr, file_path)
+                    if addr in self.acq_buffer_dict:
+                        self.acq_buffer_dict[addr].extend(acq_data)
+                    if addr in self.welch_dict:
+                        self.welch_dict[addr].feed(acq_data)
+                    if file_path.endswith(acq_binary.BIN_EXT):
+                        # f2: campioni al netto della baseline dell'asse (precisione float16 sulle oscillazioni)
+                        offset = self.first_data_dict.get(addr, 0.0) if self.acq_format == 'f2' else 0.0
+                        self.stream_writer.write(addr, acq_binary.encode_samples(acq_data, self.acq_format, offset))
+                    else:
+                        self.stream_writer.write(addr, ProtocolDecoder.format_samples(acq_data))
                 except IOError as e:
                     self.append_history(f"\t [ERROR] impossibile scrivere su file {file_path}: {str(e)}")
                     return acq_data     #restituisci comunque i dati
@@ -188,6 +474,26 @@ class Gateway:
             self.append_history(f"\t[ERROR] Errore in _process_data_stream per {addr}: {str(e)}")
             return []
 
+    def _expected_samples(self, addr):
+        """
+            Numero di campioni atteso per l'acquisizione, dal parametro datakb del config.txt
+            (default: acquisizione massima)
+        """
+        param = self.config_dict.get(addr, '').split(' ')
+        if len(param) > 3 and param[3] in ProtocolDecoder.DATAKB_MAP:
+            return ProtocolDecoder.DATAKB_MAP[param[3]]
+        return max(ProtocolDecoder.DATAKB_MAP.values())
+
+    def _write_marker(self, addr, marker):
+        """
+            Scrive un marker testuale (pacchetti mancanti, trasmissione incompleta) nello stream aperto.
+            I file binari non hanno marker: l'evento resta tracciato solo nell'history.log
+        """
+        file_path = self.stream_writer.path(addr)
+        if file_path is None or file_path.endswith(acq_binary.BIN_EXT):
+            return
+        self.stream_writer.write(addr, marker)
+
     # Aspetta di ricevere un pacchetto dati sul canale impostato nel gateway, da qualunque fonte.
     # I valori restituiti sono il payload e l'indirizzo del dispositivo che ha trasmesso i dati.
     # def get_data(self):
@@ -221,17 +527,35 @@ class Gateway:
     #         return None, None
 
 
+    def warm_up_fft(self):
+        """
+            Precalcola i piani FFT (twiddle e bit-reversal) per le dimensioni di acquisizione
+            presenti nel config.txt (solo backend python)
+        """
+        if resolve_backend(self.fft_backend) != "python":
+            return
+        try:
+            self.check_device_config()
+        except Exception as e:
+            self.append_history(f"\t[WARN] Warm-up FFT saltato: {str(e)}\n")
+            return
+
+        sizes = set()
+        for config_str in self.config_dict.values():
+            param = config_str.split(' ')
+            for i in (3, 9):                                # datakb acquisizione e shock
+                if len(param) > i and param[i] in ProtocolDecoder.DATAKB_MAP:
+                    sizes.add(ProtocolDecoder.DATAKB_MAP[param[i]])
+        warm_up(sizes)
+        self.append_history(f"\t[FFT] Piani precalcolati per {sorted(sizes)} campioni\n")
+
     def check_device_config(self):
         """
             Apre il file di configurazione dei sensori (/scripts/config.txt) e
             e mappa addr => parametri_sensore
+            (riletto solo se il file e' cambiato, vedi utils.device_config)
         """
-        with open(self.config_file, 'r') as c:
-            lines = c.readlines()               # Legge tutte le righe insieme.
-            for line in lines:                  # Analizza una riga per volta.
-                config_address = line[:16]      # MAC
-                config_parameters = line[17:]   # Parametri (range, ODR, asse, soglie si shock)
-                self.config_dict[config_address] = config_parameters.strip() 
+        self.device_config.refresh()
 
     # Processa il payload ricevuto, in base al primo byte del pacchetto.
     # 0xA1 = sincronizzazione;
@@ -279,6 +603,9 @@ class Gateway:
         device_status = self.check_device(payload, addr)
         config_status = self.send_config(addr)
 
+        # risultati delle analisi ancora in corso per questo sensore
+        self.collect_analysis(addr)
+
         # --- NUOVA LOGICA PER LOG PICCHI MULTIPLI ---
         current_fft = self.fft_dict.get(addr, {})                             #se non c'e' FFT per questo addr, uso dict di default
 
@@ -303,56 +630,18 @@ class Gateway:
         peak_memrss = current_fft.get('memrss', -1)
 
         sys_monitor = f"Process time: {process_time_cpu:.2f}, Wall time: {wall_time_cpu:.2f}, %CPU: {percentage_cpu:.2f}, RAM: {peak_memrss:.2f}"
+        if self.radio_queue_size > 0:
+            radio = self.xbee.get_stats()
+            sys_monitor += (f", Radio queue: {radio['depth']} (max {radio['high_water']}), "
+                            f"rx {radio['received']}, dropped {radio['dropped']}")
 
         # checkF_status = self.check_files(addr, 0)
         # if checkF_status != '':
         #     self.append_history("\t" + checkF_status + "\n")
 
-        # 4. GESTIONE UPLOAD
-        pending_fastapi = self.file2s_fastapi_dict.get(addr, [])
-        pending_ftp = self.file2s_dict_ftp.get(addr, [])
-        success_fastapi = []
-        success_ftp = []
-        try:
-            # FastAPI
-            success_fastapi = self.fastapi_handler.upload_file(
-                addr=addr,
-                files_to_send=pending_fastapi,
-                local_dir=self.DATA_DIR,
-                fft_result=self.fft_dict.get(addr, {}),
-                logger_callback=self.append_history
-            )
-        except Exception as e:
-            self.append_history(f"\t[CRITICAL][FastAPI] Errore: {str(e)}\n")
-        try:
-            # FTP
-            success_ftp = self.send_file_to_server(addr)
-        except Exception as e:
-            self.append_history(f"\t[CRITICAL][FTP] Errore: {str(e)}\n")
-        
-        if success_fastapi is None:
-            success_fastapi = []
-        if success_ftp is None:
-            success_ftp = []
-
-        # aggiornamento delle code rimuovendo solamente i successi
-        for file in success_fastapi: 
-            if file in pending_fastapi:
-                pending_fastapi.remove(file)
-        for file in success_ftp:
-            if file in pending_ftp:
-                pending_ftp.remove(file)
-
-        # Cleaup:
-        # file rimosso solo e non e' in nessuna coda
-        files_on_disk = os.listdir(self.DATA_DIR)
-        for filename in files_on_disk:
-            if filename.startswith(addr) and filename.endswith(".log"):
-                if filename not in pending_ftp:
-                    try:
-                        os.remove(os.path.join(self.DATA_DIR, filename))
-                    except Exception as e:
-                        self.append_history(f"\t[ERROR] Cleanup fallito per {filename}: {str(e)}")
+        # 4. GESTIONE UPLOAD (worker in background, esiti raccolti nel loop principale)
+        self._background_upload_task(addr)
+
         full_log_entry = f"\t{device_status.strip()}\n\t{fft_dict}\t{sys_monitor}\t{config_status.strip()}\n"
         self.append_history(full_log_entry)
 
@@ -392,18 +681,34 @@ class Gateway:
 
         # 3. Creazioen file
         date_time = self.t.strftime('%d_%m_%Y_%H_%M_%S')
-        filename = f"{self.DATA_DIR}{addr}_{header['axis_label']}_{date_time}.log"
+        ext = '.log' if self.acq_format == 'log' else acq_binary.BIN_EXT
+        filename = f"{self.DATA_DIR}{addr}_{header['axis_label']}_{date_time}{ext}"
         self.open_file_dict[addr] = filename
         self.pack_num_dict[addr] = 1
 
+        # buffer in memoria per la FFT a fine stream
+        try:
+            self.acq_buffer_dict[addr] = AcquisitionBuffer.from_header(header, self._expected_samples(addr))
+        except ValueError:
+            self.acq_buffer_dict.pop(addr, None)                    #header non valido: FFT dal file
+
+        self.welch_dict.pop(addr, None)
+        if self.welch_segment_len and addr in self.acq_buffer_dict:
+            self.welch_dict[addr] = StreamingWelch(
+                self.acq_buffer_dict[addr].metadata['fs'], self.welch_segment_len, backend=self.fft_backend)
+
         # umidita da dict di classe
         current_hum = self.last_humidity_dict.get(addr, 0.0)
         
-        with open(filename, 'w+') as f:
+        self.stream_writer.open(addr, filename)
+        if ext == acq_binary.BIN_EXT:
+            self.stream_writer.write(addr, acq_binary.encode_header(
+                header, [float(v) for v in mean_val], current_hum, header['baselines'], self.acq_format))
+        else:
             # ricostruzione header
-            f.write(f"{header['time']};{acc_range}{acc_odr}{acc_axis}{sync}")
-            f.write(f"{';'.join(mean_val)};{current_hum};\n")
-            f.write(f"{header['baselines'][0]};{header['baselines'][1]};{header['baselines'][2]};\n")
+            self.stream_writer.write(addr, f"{header['time']};{acc_range}{acc_odr}{acc_axis}{sync}"
+                                           f"{';'.join(mean_val)};{current_hum};\n"
+                                           f"{header['baselines'][0]};{header['baselines'][1]};{header['baselines'][2]};\n")
         
         # 4. Processamento effettivo dei campioni dati
         acq_data = self._process_stream_data(payload[31:], addr, first_value=0, is_append=True)
@@ -420,10 +725,10 @@ class Gateway:
             self.append_history("\t" + checkF_status + "\n")
             if "Anomalous closure" in checkF_status:
                 filename =  self.DATA_DIR + addr + '_UnknownAxis_' + date_time + '.log'
-                self.file2s_dict_ftp[addr] = [filename]
+                self._enqueue_upload(addr, os.path.basename(filename), ('ftp',))
                 self.open_file_dict[addr] = filename
-                with open(filename, 'w+') as f:
-                    f.write('* MISSING PACKETS FROM 1 TO %d *;' % (n_pck - 1))
+                self.stream_writer.open(addr, filename)
+                self.stream_writer.write(addr, '* MISSING PACKETS FROM 1 TO %d *;' % (n_pck - 1))
 
         first_val = self.first_data_dict.get(addr, 0)           #valore baseline
         acq_data = self._process_stream_data(payload[3:], addr, first_val, is_append=True)
@@ -446,28 +751,29 @@ class Gateway:
             self.append_history("\t" + checkF_status + "\n")
             if "Anomalous closure" in checkF_status:
                 filename =  self.DATA_DIR + addr + '_UnknownAxis_' + date_time + '.log'
-                self.file2s_dict_ftp[addr] = [filename]
+                self._enqueue_upload(addr, os.path.basename(filename), ('ftp',))
                 self.open_file_dict[addr] = filename
-                with open(filename, 'w+') as f:
-                    f.write('* MISSING PACKETS FROM 1 TO %d *;' % (n_pck - 1))
+                self.stream_writer.open(addr, filename)
+                self.stream_writer.write(addr, '* MISSING PACKETS FROM 1 TO %d *;' % (n_pck - 1))
         first_val = self.first_data_dict.get(addr, 0)
         acq_data = self._process_stream_data(payload[3:], addr, first_val, is_append=True)
 
+        self.stream_writer.close(addr)                  # flush e chiusura prima di rileggere il file
+
         if addr in self.open_file_dict and self.open_file_dict[addr]:
             full_path = self.open_file_dict[addr]
             file2send = full_path.replace( self.DATA_DIR, '') 
 
             # aggiunge file valido alla coda
-            if addr in self.file2s_dict_ftp:
-                self.file2s_dict_ftp[addr].append(file2send)
-            else:
-                self.file2s_dict_ftp[addr] = [file2send]
+            self._enqueue_upload(addr, file2send, ('ftp',))
 
-            self.work_flow_fft(addr, full_path)         # start pipeline FFT
+            # start pipeline FFT (dal buffer in memoria se disponibile)
+            acquisition = self.acq_buffer_dict.pop(addr, None)
+            self.work_flow_fft(addr, full_path, acquisition)
 
             # aggiunta alla coda influxdb e fastapi
             if checkF_status == '':
-                self.file2s_fastapi_dict.setdefault(addr, []).append(file2send)
+                self._enqueue_upload(addr, file2send, ('fastapi',))
 
         else:
             self.append_history(f"\t[WARN] Nessun file aperto per {addr}\n")
@@ -477,6 +783,8 @@ class Gateway:
             self.open_file_dict.pop(addr)
         if addr in self.first_data_dict:
             self.first_data_dict.pop(addr)
+        self.acq_buffer_dict.pop(addr, None)
+        self.welch_dict.pop(addr, None)
         self.pack_num_dict[addr] = 0            #reset pkg counter
 
 
@@ -503,11 +811,11 @@ class Gateway:
         # Inserisco nelle code di invi
         file2send = filename.replace(self.DATA_DIR, '')
         self.file2s_influx_dict.setdefault(addr, []).append(file2send)
-        self.file2s_dict_ftp.setdefault(addr, []).append(file2send)
+        self._enqueue_upload(addr, file2send, ('ftp',))
 
         # 3. Cleanup: rimuovo dalla gestione stream il file (autoconclusivo)
         self.open_file_dict.pop(addr, None)
-        self.file2s_dict_ftp.setdefault(addr, []).append(filename.replace(self.DATA_DIR, ''))       #inserisce nella coda FTP
+        self._enqueue_upload(addr, filename.replace(self.DATA_DIR, ''), ('ftp',))                  #inserisce nella coda FTP
 
 
 
@@ -528,19 +836,20 @@ class Gateway:
         self.open_file_dict[addr] = filename
 
         # 1. Scrittura header
-        with open(filename, 'w+') as f:
-            f.write(f"{header['time']};2g;100Hz;Unknown_axis; \n")  # Riga 0: Header
-            f.write("Asynced;\n")                                   # Riga 1: Sync
-            f.write("0;0;0;0;\n")                                   # Riga 2: Summary (Temp, RMS)
-            f.write("0;0;0;\n")                                     # Riga 3: First Values
+        self.stream_writer.open(addr, filename)
+        self.stream_writer.write(addr, f"{header['time']};2g;100Hz;Unknown_axis; \n"  # Riga 0: Header
+                                       "Asynced;\n"                                   # Riga 1: Sync
+                                       "0;0;0;0;\n"                                   # Riga 2: Summary (Temp, RMS)
+                                       "0;0;0;\n")                                    # Riga 3: First Values
 
         # 2. Decoding e scrittura su file
         self._process_stream_data(payload[4:], addr, first_value=0, is_append=True)
+        self.stream_writer.close(addr)
 
         # 3. Aggiunta dei file alle code
         file2send = filename.replace(self.DATA_DIR, '')
 
-        self.file2s_dict_ftp.setdefault(addr, []).append(file2send)
+        self._enqueue_upload(addr, file2send, ('ftp',))
         self.file2s_influx_dict.setdefault(addr, []).append(file2send)
 
         # 5. Invio influx
@@ -570,7 +879,7 @@ class Gateway:
             (delay incrementale non so perche)
         """
         self.device_dict[addr] = self.delay
-        self.delay = self.delay + self.delay_time   
+        self.delay = self.delay + self.delay_step
         with open(self.device_file, 'a') as f:
             f.write(addr + ' %02d \n' % self.device_dict[addr])
 
@@ -617,68 +926,86 @@ class Gateway:
 
 
     
-    def work_flow_fft(self, addr, log_file_path):
+    def work_flow_fft(self, addr, log_file_path, acquisition=None):
+        """
+            Pipeline FFT + peak detection su un'acquisizione (metrics.analysis.run_analysis).
+            Se acquisition (AcquisitionBuffer) e' presente i campioni arrivano dalla memoria,
+            altrimenti vengono riletti dal file con load_sensor.
+            Con analysis_workers > 0 il job viene eseguito nel pool di processi e i risultati
+            vengono riportati in fft_dict da collect_analysis.
+        """
+        welch = self._welch_summary(addr, acquisition)
+        job = build_job(log_file_path, acquisition, {
+            "fft_backend": self.fft_backend,
+            "fft_padding": self.fft_padding,
+            "is_flexibile_structure": self.is_flexibile_structure,
+            "peak_refine": self.peak_refine,
+        })
+
+        if self.analysis_executor is not None:
+            self.analysis_executor.submit(addr, run_analysis, (job,), context=welch)
+            return
 
         try:
-            start_cpu = time.process_time()                                 #snapshot iniziale CPU e tempo reale
-            start_wall = time.perf_counter()
-
-            # 1. caricamento dati
-            data_loaded = load_sensor(log_file_path)
-            if data_loaded is None:
-                self.append_history(f"\t[WARN] File {log_file_path} corrotto o incompleto, salto FFT\n")
-            samples = data_loaded["samples"]
-            fs = data_loaded["metadata"]["fs"]
-            axis = data_loaded["metadata"]["axis"]
-            
-            if(len(samples) > 0):
-                res_fft = start_fft(samples, fs)                            # risultati fft
-            else:
-                print(f"\t[WARNING] Nessun campione nel file per FFT")
-
-            if self.is_flexibile_structure:
-                peaks = get_top_peaks_prominence(res_fft, fs)
-            elif not self.is_flexibile_structure:
-                peaks = get_top_peaks_resolution(res_fft, fs)
-            
-            if addr not in self.fft_dict:
-                self.fft_dict[addr] = {}
-
-            # init del dizionario per id di sensore
-            self.fft_dict[addr][axis] ={
-                'peak_freq': -1, 'max_mag': -1,
-                'process_time': -1, 'wall_time': -1,
-                'percentage_cpu': -1, 'memrss': -1
-            }
-
-            if peaks:
-                self.fft_dict[addr][axis]['peak_freq'] = peaks[0]['freq']
-                self.fft_dict[addr][axis]['max_mag'] = peaks[0]['mag']
-                for i,p in enumerate(peaks):
-                    self.fft_dict[addr][axis][f'peak_freq_{i+1}'] = p['freq']
-                    self.fft_dict[addr][axis][f'max_mag_{i+1}'] = p['mag']
-            else:
-                print(f"\t[WARNING] nessun campione nel file per FFT per sensore {addr}")
-            
-            end_cpu = time.process_time()
-            end_wall = time.perf_counter()                                  # snapshot finale
-            
-            cpu_delta = end_cpu - start_cpu
-            wall_delta = end_wall - start_wall                              # calcolo differenze
-            
-            cpu_percent = (cpu_delta / wall_delta) * 100 if (wall_delta > 0) else 0             # calcolo % cpu
-            
-            mem_peal = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-            
-            self.fft_dict[addr][axis]["process_time"] = cpu_delta
-            self.fft_dict[addr][axis]["wall_time"] = wall_delta
-            self.fft_dict[addr][axis]["percentage_cpu"] = cpu_percent
-            self.fft_dict[addr][axis]["memrss"] = mem_peal
-
+            result = run_analysis(job)
         except Exception as e:
             print(f"\t[ERROR] Errore durante FFT: {str(e)}\n")
+            result = None
+        self._merge_analysis(addr, result, welch)
+
 
+    def collect_analysis(self, addr=None):
+        """
+            Riporta in fft_dict i risultati dei job terminati nel pool.
+            Con addr attende anche i job ancora in corso per quel sensore (al massimo analysis_sync_wait s).
+        """
+        if self.analysis_executor is None:
+            return
+        if addr is None:
+            outcomes = self.analysis_executor.poll()
+        else:
+            # attesa limitata: il loop radio resta fermo al massimo analysis_sync_wait secondi
+            outcomes = self.analysis_executor.wait(addr, self.analysis_sync_wait)
+            if self.analysis_executor.pending(addr):
+                self.append_history(f"\t[WARN] Analisi FFT di {addr} ancora in corso, "
+                                    f"risultati al sync successivo\n")
 
+        for job_addr, welch, ok, value in outcomes:
+            if not ok:
+                self.append_history(f"\t[ERROR] Analisi FFT fallita per {job_addr}: {value}\n")
+                value = None
+            self._merge_analysis(job_addr, value, welch)
+
+
+    def _merge_analysis(self, addr, result, welch):
+        """
+            result: (asse, risultati) di run_analysis oppure None
+            welch: picco della PSD di Welch (_welch_summary) oppure None
+        """
+        if result is not None:
+            axis, axis_res = result
+            self.fft_dict.setdefault(addr, {})[axis] = axis_res
+        if welch is not None:
+            axis = welch.pop('axis')
+            self.fft_dict.setdefault(addr, {}).setdefault(axis, {}).update(welch)
+
+
+    def _welch_summary(self, addr, acquisition):
+        """
+            Picco della PSD di Welch calcolata durante la ricezione, da riportare in fft_dict
+        """
+        welch = self.welch_dict.pop(addr, None)
+        if welch is None or acquisition is None:
+            return None
+        peak = welch.peak()
+        if peak is None:
+            return None
+        return {
+            'axis': acquisition.metadata["axis"],
+            'welch_peak_freq': peak[0],
+            'welch_peak_psd': peak[1],
+            'welch_segments': welch.segments,
+        }
 
     def send_config(self, addr):
         """
@@ -689,7 +1016,8 @@ class Gateway:
         
         if addr in self.config_dict:
             # Se gia presente => genera pacchetto riconfig (0xA2)
-            config_hex = ProtocolDecoder.build_config_packet(self.config_dict[addr], delay)
+            config_hex = ProtocolDecoder.build_config_packet(
+                self.config_dict[addr], delay, self.device_config.fields(addr))
             status = 'Sent reconfiguration\n'
         else:
             # Invio semplicemnete pacchettodi sync 
@@ -718,20 +1046,18 @@ class Gateway:
         status = ''
         if addr in self.open_file_dict:
             if n_pack < self.pack_num_dict[addr] + 1:       # se il numero di paccheto non combacia
-                with open(self.open_file_dict[addr], 'a') as f:
-                    status = '\tAnomalous closure for data stream - %s\n' % self.open_file_dict[addr]
-                    f.write('* INCOMPLETE TRANSMISSION *;')
+                status = '\tAnomalous closure for data stream - %s\n' % self.open_file_dict[addr]
+                self._write_marker(addr, '* INCOMPLETE TRANSMISSION *;')
+                self.stream_writer.close(addr)
                 file2send = self.open_file_dict[addr].replace( self.DATA_DIR, '')
-                if addr in self.file2s_dict_ftp:
-                    self.file2s_dict_ftp[addr].append(file2send)
-                else:
-                    self.file2s_dict_ftp[addr] = [file2send]
+                self._enqueue_upload(addr, file2send, ('ftp',))
                 self.open_file_dict.pop(addr)
+                self.acq_buffer_dict.pop(addr, None)
+                self.welch_dict.pop(addr, None)
                 if addr in self.first_data_dict: self.first_data_dict.pop(addr)
             elif n_pack > self.pack_num_dict[addr] + 1:
-                with open(self.open_file_dict[addr], 'a') as f:
-                    status = '\tMissing packets from %d to %d - %s\n' % (self.pack_num_dict[addr] + 1, n_pack - 1, addr)
-                    f.write('* MISSING PACKETS FROM %d TO %d *;' % (self.pack_num_dict[addr] + 1, n_pack - 1))
+                status = '\tMissing packets from %d to %d - %s\n' % (self.pack_num_dict[addr] + 1, n_pack - 1, addr)
+                self._write_marker(addr, '* MISSING PACKETS FROM %d TO %d *;' % (self.pack_num_dict[addr] + 1, n_pack - 1))
         elif n_pack > 1:
             status = '\tAnomalous closure - missing data from device: %s\n' % addr
             if addr in self.first_data_dict: self.first_data_dict.pop(addr)
@@ -812,7 +1138,12 @@ class Gateway:
             Funzione per aggiornare l'history.log.
             Controlla che il .log non superi la dimensione massima fissata.
             Se super max_kb fa un rewrite
+            Dopo il caricamento della config i messaggi passano da HistoryLogger (buffer + thread),
+            prima vengono scritti subito.
         """
+        if self.history_logger is not None:
+            self.history_logger.write(stringa)
+            return
         try:
             # Recupero il percorso al file
             log_path = self.logger_file
@@ -844,21 +1175,29 @@ class Gateway:
 
     def main(self):
         try:
-            self.t = datetime.now()
+            self.t = self.clock()
 
             payload, address, raw_bytes = self.xbee.receive_data(self.append_history)
+            self.stream_writer.flush_expired()                  # flush a tempo anche senza traffico
+            self.collect_analysis()                             # risultati FFT dal pool di processi
+            self.collect_uploads()                              # esiti degli upload in background
 
             if payload is None or address is None:
                 return
 
-            self.original_payload = raw_bytes           # salviamo i byte originali per process_unknown_data
-
-            self.check_device_config()
-            self.process_data(payload, address)
+            self.handle_frame(payload, address, raw_bytes)
         except Exception as e:
             self.append_history("\tErrore generale nel main: %s\n" % str(e))
 
+    def handle_frame(self, payload, address, raw_bytes):
+        """ Elabora un frame ricevuto: config aggiornata e macchina a stati del sensore """
+        self.original_payload = raw_bytes               # salviamo i byte originali per process_unknown_data
+
+        self.check_device_config()
+        self.process_data(payload, address)
+
 
 if __name__ == "__main__":
-    gw = Gateway()
+    import sys
+    gw = Gateway(config_path=sys.argv[1]) if len(sys.argv) > 1 else Gateway()
     gw.run()
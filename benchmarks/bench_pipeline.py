@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import math
+import random
+import struct
+import argparse
+import platform
+import statistics
+import tempfile
+import timeit
+import tracemalloc
+
+from metrics.fft_iterativa import start_fft, resolve_backend, np
+from protocol_decoder import ProtocolDecoder, ol
+from utils.load_data import load_sensor
+from utils.acq_binary import log_to_bin
+from utils.get_peak_prominence import get_top_peaks_prominence
+from utils.get_peak_resolution import get_top_peaks_resolution
+from utils.peak_refine import refine_peaks
+
+
+"""
+    benchmarks.bench_pipeline:
+        Benchmark degli stadi di elaborazione di un'acquisizione, su segnali sintetici con modi noti:
+            decode_samples, decode_samples_bulk   payload radio (half-float) -> campioni
+            load_sensor, load_sensor_bin          file .log / .bin f4 -> dict campioni
+            start_fft[python], start_fft[numpy]   spettro (numpy solo se installato)
+            get_top_peaks_prominence, get_top_peaks_resolution
+            refine_peaks[python], refine_peaks[numpy]  raffinamento dei picchi (gateway.peak_refine)
+        per tutte le dimensioni di acquisizione (ProtocolDecoder.DATAKB_MAP: 2k/4k/8k/16k) a un ODR
+        (default 125 Hz: il lavoro degli stadi dipende solo da n, i modi sono frazioni di fs).
+
+    Per ogni stadio: tempo per chiamata (mediana e minimo su --repeat misure, ognuna di almeno 0.2 s
+    con timeit.Timer.autorange, cosi' anche gli stadi da pochi us sono sopra la risoluzione del clock),
+    picco di memoria allocata (tracemalloc, esecuzione separata) e, per i peak detector, numero
+    di modi noti trovati.
+    Il confronto con il file di baseline segnala come regressione:
+        - tempo minimo (il meno sensibile al carico della macchina) o memoria oltre la baseline
+          di piu' di --tolerance (default 50%)
+        - meno modi trovati della baseline
+    con exit code 1. Le combinazioni dimensione/ODR con regressioni vengono rimisurate una volta:
+    conta solo la regressione confermata (un picco di carico della macchina non basta).
+    La baseline dipende dalla macchina: va rigenerata con --save sul dispositivo o sulla macchina
+    di riferimento.
+
+    Uso (dalla cartella del gateway):
+        python -m benchmarks.bench_pipeline                     confronto con benchmarks/baseline.json
+        python -m benchmarks.bench_pipeline --save              salva i risultati come nuova baseline
+        python -m benchmarks.bench_pipeline --sizes 2k 8k --odrs 31.25 500 --repeat 3
+"""
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+SIZES = dict(ProtocolDecoder.DATAKB_MAP)                            # "2k" -> 2048 campioni, ...
+ODRS = {label.replace(" Hz", ""): float(label.replace(" Hz", "")) for label in ol.values()}
+DEFAULT_ODRS = ["125"]
+
+# modi del segnale sintetico come frazione di fs: (frequenza/fs, ampiezza)
+MODES = ((0.0256, 1.0), (0.0632, 0.6), (0.1232, 0.3))
+NOISE = 0.02
+MODE_TOLERANCE_BINS = 2                                             # distanza massima picco-modo in bin
+
+
+def synthetic_signal(n, fs, seed=1):
+    """ Somma dei modi noti con rumore gaussiano (deterministica dato il seed) """
+    rnd = random.Random(seed)
+    return [sum(a * math.sin(2 * math.pi * (r * fs) * (i / fs)) for r, a in MODES) + rnd.gauss(0, NOISE)
+            for i in range(n)]
+
+
+def encode_payload(samples):
+    """ Campioni nel formato radio dei sensori (half-float big endian) """
+    return list(struct.pack(">%de" % len(samples), *samples))
+
+
+def write_log(path, samples, fs):
+    """ File di acquisizione nel formato testuale del gateway """
+    label = f"{fs:g} Hz"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"12:30:5;2g;{label};X axis;\nSynced;\n25.0;0.1;0.2;0.3;50.0;\n0.1;0.2;-0.3;\n")
+        f.write(ProtocolDecoder.format_samples(samples) + "\n")
+
+
+def modes_found(peaks, n, fs):
+    """ Numero di modi noti con un picco entro MODE_TOLERANCE_BINS bin """
+    tol = MODE_TOLERANCE_BINS * fs / n
+    return sum(1 for r, _ in MODES if any(abs(p["freq"] - r * fs) <= tol for p in peaks))
+
+
+def measure(fn, repeat):
+    """ Returns: (mediana ms, minimo ms per chiamata, picco memoria KB, valore restituito) """
+    value = fn()                                                    # cache e tabelle (piani FFT, half-float)
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()                                   # chiamate per misura (>= 0.2 s)
+    times = [t / number * 1000 for t in timer.repeat(repeat, number)]
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), min(times), peak / 1024, value
+
+
+def run_case(size_label, odr_label, repeat, tmp_dir):
+    """ Tutti gli stadi per una dimensione e un ODR. Returns: dict chiave -> risultato """
+    n = SIZES[size_label]
+    fs = ODRS[odr_label]
+    samples = synthetic_signal(n, fs)
+    payload = encode_payload(samples)
+    log_path = os.path.join(tmp_dir, f"bench_{size_label}_{odr_label}.log")
+    write_log(log_path, samples, fs)
+    bin_path = log_to_bin(log_path)
+
+    backends = ["python"] + (["numpy"] if resolve_backend("auto") == "numpy" else [])
+    stages = [
+        ("decode_samples", lambda: ProtocolDecoder.decode_samples(payload)),
+        ("decode_samples_bulk", lambda: ProtocolDecoder.decode_samples_bulk(payload)),
+        ("load_sensor", lambda: load_sensor(log_path)),
+        ("load_sensor_bin", lambda: load_sensor(bin_path)),
+    ]
+    for backend in backends:
+        stages.append((f"start_fft[{backend}]", lambda b=backend: start_fft(samples, fs, b)))
+
+    results = {}
+    for name, fn in stages:
+        median_ms, min_ms, peak_kb, _ = measure(fn, repeat)
+        results[f"{name}|{size_label}|{odr_label}"] = {
+            "time_ms": round(median_ms, 4), "min_ms": round(min_ms, 4), "peak_kb": round(peak_kb, 1)}
+
+    res_fft = start_fft(samples, fs)                                # spettro del backend di default
+    for name, fn in (("get_top_peaks_prominence", get_top_peaks_prominence),
+                     ("get_top_peaks_resolution", get_top_peaks_resolution)):
+        median_ms, min_ms, peak_kb, peaks = measure(lambda f=fn: f(res_fft, fs), repeat)
+        results[f"{name}|{size_label}|{odr_label}"] = {
+            "time_ms": round(median_ms, 4), "min_ms": round(min_ms, 4), "peak_kb": round(peak_kb, 1),
+            "modes": modes_found(peaks, len(res_fft), fs)}
+
+    for backend in backends:                                        # picchi di get_top_peaks_resolution
+        median_ms, min_ms, peak_kb, _ = measure(
+            lambda b=backend: refine_peaks(samples, fs, len(res_fft), peaks, backend=b), repeat)
+        results[f"refine_peaks[{backend}]|{size_label}|{odr_label}"] = {
+            "time_ms": round(median_ms, 4), "min_ms": round(min_ms, 4), "peak_kb": round(peak_kb, 1)}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """ Returns: lista di (chiave, messaggio) delle regressioni rispetto alla baseline """
+    regressions = []
+    for key, res in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for field, label in (("min_ms", "tempo"), ("peak_kb", "memoria")):
+            if base[field] > 0 and res[field] > base[field] * (1 + tolerance):
+                regressions.append((key, f"{label} {res[field]:g} (baseline {base[field]:g}, "
+                                         f"+{(res[field] / base[field] - 1) * 100:.0f}%)"))
+        if res.get("modes", 0) < base.get("modes", 0):
+            regressions.append((key, f"modi trovati {res['modes']} (baseline {base['modes']})"))
+    return regressions
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__ if np is not None else None,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def print_table(results, baseline):
+    print(f"{'stadio':<28}{'n':>5}{'ODR':>7}{'mediana ms':>12}{'min ms':>10}{'picco KB':>10}{'modi':>6}{'vs base':>9}")
+    for key, res in results.items():
+        name, size_label, odr_label = key.split("|")
+        base = baseline.get(key)
+        delta = f"{(res['min_ms'] / base['min_ms'] - 1) * 100:+.0f}%" if base and base["min_ms"] > 0 else "-"
+        modes = res.get("modes")
+        print(f"{name:<28}{size_label:>5}{odr_label:>7}{res['time_ms']:>12.3f}{res['min_ms']:>10.3f}"
+              f"{res['peak_kb']:>10.1f}{'-' if modes is None else modes:>6}{delta:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark della pipeline di elaborazione del gateway")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--odrs", nargs="+", choices=list(ODRS), default=DEFAULT_ODRS,
+                        help="ODR dei segnali (default 125)")
+    parser.add_argument("--repeat", type=int, default=5, help="misure per stadio (default 5)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="file di baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="margine di regressione (default 0.5)")
+    parser.add_argument("--save", action="store_true", help="salva i risultati come baseline")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size_label in args.sizes:
+            for odr_label in args.odrs:
+                results.update(run_case(size_label, odr_label, args.repeat, tmp_dir))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f).get("results", {})
+    print_table(results, baseline)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"environment": environment(), "repeat": args.repeat, "results": results}, f, indent=1)
+        print(f"Baseline salvata in {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        cases = sorted({tuple(key.split("|")[1:]) for key, _ in regressions})
+        rerun = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for size_label, odr_label in cases:
+                rerun.update(run_case(size_label, odr_label, args.repeat, tmp_dir))
+        confirmed = {key for key, _ in compare(rerun, baseline, args.tolerance)}
+        regressions = [(key, message) for key, message in regressions if key in confirmed]
+    for key, message in regressions:
+        print(f"[REGRESSIONE] {key}: {message}")
+    if not baseline:
+        print(f"Nessuna baseline in {args.baseline} (usare --save)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import os
+import json
+import queue
+import signal
+import time
+import zlib
+import multiprocessing
+from datetime import datetime
+
+from GT_FFT_v5 import Gateway
+from protocol_radio import XBeeManager
+from utils.history_logger import HistoryLogger
+from utils.frame_capture import CaptureWriter
+
+
+"""
+    gateway_shards:
+        Modalita' sharded del gateway: piu' processi, ognuno con la macchina a stati (process_data)
+        di un sottoinsieme di sensori, cosi' decodifica e FFT usano piu' core.
+        - un processo front possiede la radio: legge i frame e li instrada al worker
+          crc32(MAC) % shards (un sensore resta sempre sullo stesso processo)
+        - ogni worker e' un Gateway completo con una ProxyRadio: riceve i frame dalla propria coda
+          e rimanda al front le risposte (config 0xA2, sync), inviate dalla radio vera
+        - history.log e registro upload separati per worker (history_shard<i>.log, ...),
+          devices.txt condiviso con delay intercalati tra i worker (Gateway._apply_shard)
+        - un worker terminato in modo anomalo viene riavviato (lo stato in memoria dei suoi sensori
+          riparte dal sync successivo, come dopo un riavvio del gateway)
+
+    Avvio: python gateway_shards.py [gw_config.json] (con gateway.shards < 2 parte il gateway a processo singolo)
+"""
+
+FRONT_POLL = 0.05                       # timeout di lettura radio del front (s): latenza massima delle risposte
+INBOX_SIZE = 512                        # frame in attesa per worker (se piena viene scartato il piu' vecchio)
+CHECK_INTERVAL = 1.0                    # controllo dei worker terminati (s)
+STATS_INTERVAL = 60.0                   # riepilogo dei contatori in history.log (s)
+JOIN_TIMEOUT = 10.0                     # attesa della chiusura di un worker allo stop (s)
+
+
+def shard_index(addr, count):
+    """ Worker assegnato al sensore (stabile tra i riavvii) """
+    return zlib.crc32(addr.encode()) % count
+
+
+def run_shard(index, count, inbox, replies, config_path):
+    """ Processo worker: Gateway con radio proxy, chiuso dal front con None sulla coda """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)        # Ctrl+C gestito solo dal front
+    radio = ProxyRadio(inbox, replies)
+    gw = Gateway(config_path=config_path, xbee=radio, shard=(index, count))
+    radio.on_close = gw.stop
+    gw.run()
+
+
+class ProxyRadio:
+    """
+        Radio di un worker, stessa interfaccia di XBeeManager usata dal Gateway:
+        frame (payload_bytes, addr) letti dalla coda del worker, invii (addr, hex_payload)
+        accodati al front.
+    """
+
+    def __init__(self, inbox, replies, timeout=5):
+        self.inbox = inbox
+        self.replies = replies
+        self.timeout = timeout
+        self.on_close = None                            # chiamata alla ricezione dello stop dal front
+        self.parent_pid = os.getppid()
+        self.stats = {'received': 0, 'dropped': 0, 'high_water': 0}
+
+    def start(self, logger_callback):
+        logger_callback("\t[Radio] Worker collegato al processo radio\n")
+
+    def stop(self, logger_callback):
+        pass
+
+    def receive_data(self, logger_callback):
+        try:
+            frame = self.inbox.get(timeout=self.timeout)
+        except queue.Empty:
+            if os.getppid() == self.parent_pid:
+                return None, None, None
+            frame = None                                # front terminato senza stop: chiusura
+        if frame is None:
+            if self.on_close is not None:
+                self.on_close()
+            return None, None, None
+
+        payload_bytes, addr = frame
+        self.stats['received'] += 1
+        self.stats['high_water'] = max(self.stats['high_water'], self._depth() + 1)
+        return list(payload_bytes), addr, payload_bytes
+
+    def send_data(self, addr, hex_payload, logger_callback):
+        # esito dell'invio noto solo al front (errori nel suo history.log)
+        self.replies.put((addr, hex_payload))
+        return True
+
+    def get_stats(self):
+        """ Contatori della coda del worker (i frame scartati sono contati dal front) """
+        stats = dict(self.stats)
+        stats['depth'] = self._depth()
+        return stats
+
+    def _depth(self):
+        try:
+            return self.inbox.qsize()
+        except NotImplementedError:                     # qsize non disponibile su alcune piattaforme
+            return 0
+
+
+class ShardedGateway:
+    """ Processo front: radio, instradamento dei frame ai worker e invio delle loro risposte """
+
+    def __init__(self, config_path=Gateway.CONFIG_PATH, count=None):
+        with open(config_path, 'r') as file:
+            config = json.load(file)
+        gw_config = config['gateway']
+
+        self.config_path = config_path
+        self.count = count if count is not None else gw_config.get('shards', 0)
+        if self.count < 1:
+            raise ValueError(f"numero di shard non valido: {self.count}")
+        self.device_file = gw_config['device_file']
+        self.history_logger = HistoryLogger(gw_config['logger_file'],
+                                            flush_interval=gw_config.get('history_flush_interval', 1.0))
+
+        capture_file = gw_config.get('capture_file')
+        self.capture = CaptureWriter(capture_file, max_mb=gw_config.get('capture_max_mb', 64)) if capture_file else None
+        self.xbee = XBeeManager(timeout=FRONT_POLL, queue_size=gw_config.get('radio_queue_size', 512),
+                                capture=self.capture)
+        self.replies = multiprocessing.Queue()
+        self.inboxes = [multiprocessing.Queue(INBOX_SIZE) for _ in range(self.count)]
+        self.workers = [None] * self.count
+        self.running = True
+
+        self.routed = [0] * self.count
+        self.dropped = [0] * self.count
+        self.sent = 0
+        self._last_check = 0
+        self._last_stats = time.monotonic()
+        self._logged_stats = None
+
+    def append_history(self, text):
+        self.history_logger.write(text)
+
+    def run(self):
+        try:
+            # reset file sensori (i worker vi aggiungono i propri)
+            with open(self.device_file, 'w+') as f:
+                pass
+
+            # worker avviati prima del thread di lettura radio
+            for index in range(self.count):
+                self._start_worker(index)
+            self.xbee.start(self.append_history)
+            self.append_history(f"--- Gateway Start (sharded, {self.count} processi): {datetime.now()} ---\n\n")
+
+            while self.running:
+                self.main()
+
+        except Exception as e:
+            self.append_history(f"ERRORE CRITICO ESECUZIONE: {e}\n")
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self.running = False
+
+    def main(self):
+        try:
+            payload, address, raw_bytes = self.xbee.receive_data(self.append_history)
+            if address is not None:
+                self.route(address, raw_bytes)
+            self.forward_replies()
+
+            now = time.monotonic()
+            if now - self._last_check >= CHECK_INTERVAL:
+                self._last_check = now
+                self.check_workers()
+            if now - self._last_stats >= STATS_INTERVAL:
+                self._last_stats = now
+                self.log_stats()
+        except Exception as e:
+            self.append_history("\tErrore generale nel main: %s\n" % str(e))
+
+    def route(self, addr, payload_bytes):
+        """ Accoda il frame al worker del sensore """
+        index = shard_index(addr, self.count)
+        inbox = self.inboxes[index]
+        frame = (bytes(payload_bytes), addr)
+        try:
+            inbox.put_nowait(frame)
+        except queue.Full:
+            # worker che non sta al passo: scarto il frame piu' vecchio, come la coda radio
+            try:
+                inbox.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped[index] += 1
+            inbox.put_nowait(frame)
+        self.routed[index] += 1
+
+    def forward_replies(self):
+        """ Invia alla radio le risposte prodotte dai worker """
+        while True:
+            try:
+                addr, hex_payload = self.replies.get_nowait()
+            except queue.Empty:
+                return
+            self.xbee.send_data(addr, hex_payload, self.append_history)
+            self.sent += 1
+
+    def check_workers(self):
+        """ Riavvia i worker terminati in modo anomalo """
+        for index, worker in enumerate(self.workers):
+            if worker is not None and not worker.is_alive():
+                self.append_history(f"\t[SHARD] Worker {index} terminato (exit code {worker.exitcode}), riavvio\n")
+                # coda nuova: quella vecchia puo' avere il lock di lettura preso dal processo terminato
+                self.inboxes[index] = multiprocessing.Queue(INBOX_SIZE)
+                self._start_worker(index)
+
+    def log_stats(self):
+        stats = (list(self.routed), list(self.dropped), self.sent)
+        if stats == self._logged_stats:
+            return
+        self._logged_stats = stats
+        radio = self.xbee.get_stats()
+        self.append_history(f"\t[SHARD] Frame instradati: {self.routed}, scartati: {self.dropped}, "
+                            f"risposte inviate: {self.sent}, radio scartati: {radio['dropped']}\n")
+
+    def shutdown(self):
+        """ Stop ordinato dei worker (elaborano i frame gia' accodati), poi radio e log """
+        for index, worker in enumerate(self.workers):
+            if worker is not None and worker.is_alive():
+                try:
+                    self.inboxes[index].put(None, timeout=1.0)
+                except queue.Full:
+                    pass
+        deadline = time.monotonic() + JOIN_TIMEOUT
+        for index, worker in enumerate(self.workers):
+            if worker is None:
+                continue
+            worker.join(max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                self.append_history(f"\t[SHARD] Worker {index} non risponde, terminato\n")
+                worker.terminate()
+                worker.join()
+        self.forward_replies()
+        self.log_stats()
+        self.xbee.stop(self.append_history)
+        if self.capture is not None:
+            self.capture.close()
+        self.history_logger.close()
+
+    def _start_worker(self, index):
+        worker = multiprocessing.Process(
+            target=run_shard, args=(index, self.count, self.inboxes[index], self.replies, self.config_path),
+            name=f"gw-shard-{index}")                   # non daemon: puo' avere il proprio pool di analisi
+        worker.start()
+        self.workers[index] = worker
+
+
+if __name__ == "__main__":
+    import sys
+    config_path = sys.argv[1] if len(sys.argv) > 1 else Gateway.CONFIG_PATH
+    with open(config_path, 'r') as file:
+        shards = json.load(file)['gateway'].get('shards', 0)
+    if shards > 1:
+        ShardedGateway(config_path, count=shards).run()
+    else:
+        Gateway(config_path=config_path).run()
@@ -0,0 +1,112 @@
+import time
+import resource
+
+from metrics.fft_iterativa import start_fft
+from utils.load_data import load_sensor
+from utils.spectral_features import compute_features
+from utils.get_peak_resolution import get_top_peaks_resolution
+from utils.get_peak_prominence import get_top_peaks_prominence
+from utils.peak_refine import refine_peaks
+
+
+"""
+    metrics.analysis
+    Pipeline FFT + peak detection di un'acquisizione, indipendente dal Gateway.
+
+    Le funzioni sono a livello di modulo e lavorano solo su dati semplici (dict, liste),
+    quindi possono essere eseguite sia nel processo del gateway sia in un processo worker
+    (utils.analysis_executor): il job e il risultato sono serializzabili con pickle.
+
+    Functions
+    ---------
+    build_job(log_file_path, acquisition, options):
+        prepara il job: campioni dal buffer in memoria se disponibile, altrimenti il path del file
+    run_analysis(job):
+        esegue la pipeline e restituisce (asse, risultati) nel formato di Gateway.fft_dict[addr][asse]
+"""
+
+
+def build_job(log_file_path, acquisition, options):
+    """
+        Params:
+            - log_file_path: file dell'acquisizione (usato se acquisition e' None)
+            - acquisition: AcquisitionBuffer dello stream appena chiuso oppure None
+            - options: dict con fft_backend, fft_padding, is_flexibile_structure, peak_refine
+        Returns:
+            - dict del job
+    """
+    job = dict(options)
+    job["path"] = log_file_path
+    if acquisition is not None:
+        job["samples"] = acquisition.samples()
+        job["fs"] = acquisition.metadata["fs"]
+        job["axis"] = acquisition.metadata["axis"]
+    else:
+        job["samples"] = None
+    return job
+
+
+def run_analysis(job):
+    """
+        Returns:
+            - (axis, result): result con peak_freq/max_mag, i picchi numerati, l'eventuale
+              raffinamento e i tempi di esecuzione
+        Raises:
+            - ValueError se il file e' corrotto o non ci sono campioni
+    """
+    start_cpu = time.process_time()                                 #snapshot iniziale CPU e tempo reale
+    start_wall = time.perf_counter()
+
+    # 1. caricamento dati
+    if job["samples"] is not None:
+        samples, fs, axis = job["samples"], job["fs"], job["axis"]
+    else:
+        data_loaded = load_sensor(job["path"])
+        if data_loaded is None:
+            raise ValueError(f"File {job['path']} corrotto o incompleto, salto FFT")
+        samples = data_loaded["samples"]
+        fs = data_loaded["metadata"]["fs"]
+        axis = data_loaded["metadata"]["axis"]
+
+    if not samples:
+        raise ValueError("Nessun campione nel file per FFT")
+
+    # 2. FFT e peak detection
+    res_fft = start_fft(samples, fs, job["fft_backend"], job["fft_padding"])
+    features = compute_features(res_fft, fs, job["fft_backend"])
+
+    if job["is_flexibile_structure"]:
+        peaks = get_top_peaks_prominence(res_fft, fs, features=features)
+    else:
+        peaks = get_top_peaks_resolution(res_fft, fs, features=features)
+
+    result = {
+        'peak_freq': -1, 'max_mag': -1,
+        'process_time': -1, 'wall_time': -1,
+        'percentage_cpu': -1, 'memrss': -1
+    }
+
+    if peaks:
+        result['peak_freq'] = peaks[0]['freq']
+        result['max_mag'] = peaks[0]['mag']
+        for i, p in enumerate(peaks):
+            result[f'peak_freq_{i+1}'] = p['freq']
+            result[f'max_mag_{i+1}'] = p['mag']
+
+        # raffinamento intorno ai picchi (valori affiancati a quelli grezzi)
+        if job["peak_refine"]:
+            for i, r in enumerate(refine_peaks(samples, fs, len(res_fft), peaks, backend=job["fft_backend"])):
+                result[f'peak_freq_ref_{i+1}'] = r['freq']
+                result[f'max_mag_ref_{i+1}'] = r['mag']
+                result[f'damping_ref_{i+1}'] = r['damping']
+
+    # 3. tempi e memoria (del processo che ha eseguito il job)
+    cpu_delta = time.process_time() - start_cpu
+    wall_delta = time.perf_counter() - start_wall
+
+    result["process_time"] = cpu_delta
+    result["wall_time"] = wall_delta
+    result["percentage_cpu"] = (cpu_delta / wall_delta) * 100 if (wall_delta > 0) else 0
+    result["memrss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return axis, result
@@ -1,6 +1,33 @@
 import cmath
 import statistics
 
+try:
+    import numpy as np
+except ImportError:                     # gateway senza numpy: solo backend python
+    np = None
+
+
+"""
+    metrics.fft_iterativa
+    FFT dei campioni di un'acquisizione, con backend selezionabile:
+        - "python": FFT Radix-2 iterativa in puro Python (sempre disponibile)
+        - "numpy": real-FFT di numpy (np.fft.rfft), se numpy e' importabile
+        - "auto": numpy se disponibile, altrimenti python (default)
+
+    Entrambi i backend restituiscono lo stesso layout di spettro atteso da
+    get_top_peaks_prominence / get_top_peaks_resolution:
+        lista di n complessi, componente DC azzerata.
+
+    Lunghezze non potenza di 2 (padding):
+        - True: padding alla potenza di 2 successiva (comportamento storico)
+        - False: nessun padding, FFT sulla lunghezza effettiva (mixed-radix o Bluestein)
+        - "auto": per ogni lunghezza si sceglie la strategia meno costosa per il backend python
+          (default); la stessa decisione vale per numpy, cosi' i due backend restituiscono spettri
+          della stessa lunghezza
+"""
+
+BACKENDS = ("auto", "numpy", "python")
+
 
 def remove_dc_component(samples):
     """centratura del segnale"""
@@ -35,60 +62,319 @@ def bit_reversal(x):
             x[i], x[j] = x[j], x[i]
     return x
 
-def fft(x):
+class FFTPlan:
+    """
+        Piano FFT Radix-2 per una dimensione n (potenza di 2), riusato tra le acquisizioni:
+            - swaps: coppie (i, j) della permutazione bit-reversal
+            - stages: per ogni stadio (m, m2, twiddle) con i twiddle presi dalla tabella
+              e^(-j*2pi*k/n) calcolata una sola volta (niente accumulo di errore da w *= w_m)
+    """
+    def __init__(self, n):
+        self.n = n
+
+        # permutazione bit-reversal (stessa sequenza di bit_reversal())
+        self.swaps = []
+        j = 0
+        for i in range(1, n):
+            bit = n >> 1
+            while j & bit:
+                j ^= bit
+                bit >>= 1
+            j ^= bit
+            if i < j:
+                self.swaps.append((i, j))
+
+        # tabella twiddle e sottotabelle per stadio (passo n/m)
+        twiddles = [cmath.exp(-2.0j * cmath.pi * k / n) for k in range(n // 2)]
+        self.stages = []
+        m = 2
+        while m <= n:
+            self.stages.append((m, m >> 1, twiddles[::n // m]))
+            m <<= 1
+
+
+class RealFFTPlan:
+    """
+        Piano della real-FFT su n campioni (n pari): piano complesso su n/2 punti
+        (solo se n/2 e' potenza di 2) e twiddle e^(-j*2pi*k/n), k = 0..n/2, per lo split finale
+    """
+    def __init__(self, n):
+        self.n = n
+        h = n // 2
+        self.half_plan = get_plan(h) if _is_pow2(h) else None      # altrimenti fft_any
+        self.twiddles = [cmath.exp(-2.0j * cmath.pi * k / n) for k in range(n // 2 + 1)]
+
+
+_PLANS = {}                             # cache dei piani per dimensione
+_REAL_PLANS = {}
+
+def get_plan(n):
+    """ Restituisce (creandolo al primo uso) il piano FFT per la dimensione n """
+    plan = _PLANS.get(n)
+    if plan is None:
+        plan = _PLANS[n] = FFTPlan(n)
+    return plan
+
+def get_real_plan(n):
+    """ Come get_plan, per la real-FFT su n campioni """
+    plan = _REAL_PLANS.get(n)
+    if plan is None:
+        plan = _REAL_PLANS[n] = RealFFTPlan(n)
+    return plan
+
+def warm_up(sizes):
+    """ Precalcola i piani per le dimensioni di acquisizione previste (es. da config.txt) """
+    for size in sizes:
+        n = 1
+        while n < size:
+            n <<= 1
+        if n >= 2:
+            get_real_plan(n)
+
+def fft(x, plan=None):
     """FFT Radix-2 Iterativa (Decimation-in-Time)."""
     n = len(x)
+    if plan is None:
+        plan = get_plan(n)
+
     # bit-reversal (per lavorare in place)
-    x = bit_reversal(x)
+    for i, j in plan.swaps:
+        x[i], x[j] = x[j], x[i]
     
     # cicli principali della fft
     # stadio (log2 n stadi totali)
-    s = 1
-    while (1 << s) <= n:
-        m = 1 << s        # lunghezza del sottoproblema corrente (2, 4, 8...)
-        m2 = m >> 1       # meta lunghezza (distanza tra i rami della farfalla)
-        
-        # twiddle factor
-        # omega_m = e^(-j * 2pi / m)
-        w_m = cmath.exp(-2.0j * cmath.pi / m)
-        
+    for m, m2, twiddles in plan.stages:
+        # m: lunghezza del sottoproblema corrente (2, 4, 8...)
+        # m2: meta lunghezza (distanza tra i rami della farfalla)
+
         # itera sui blocchi di dimensione m
         for k in range(0, n, m):
-            w = 1.0 + 0j  # inizializza twiddle factor per il blocco
-            
             # operazione a farfalla (butterfly)
-            for j in range(m2):
-                u = x[k + j]
-                v = x[k + j + m2] * w
-                
-                x[k + j] = u + v
-                x[k + j + m2] = u - v
+            for j, w in enumerate(twiddles, k):
+                u = x[j]
+                v = x[j + m2] * w
                 
-                # aggiorna il twiddle factor per il prossimo bin del blocco
-                w *= w_m
-        s += 1
+                x[j] = u + v
+                x[j + m2] = u - v
     return x
 
 
 
-def start_fft(samples, fs):
+def _is_pow2(n):
+    return n > 0 and n & (n - 1) == 0
+
+def _factorize(n):
+    """ Fattori primi di n in ordine crescente """
+    factors = []
+    p = 2
+    while p * p <= n:
+        while n % p == 0:
+            factors.append(p)
+            n //= p
+        p += 1
+    if n > 1:
+        factors.append(n)
+    return factors
+
+
+_TWIDDLE_TABLES = {}                    # n -> [e^(-j*2pi*k/n)], per il mixed-radix
+_BLUESTEIN_PLANS = {}                   # n -> (chirp, FFT del filtro, M)
+
+def _twiddle_table(n):
+    table = _TWIDDLE_TABLES.get(n)
+    if table is None:
+        table = _TWIDDLE_TABLES[n] = [cmath.exp(-2.0j * cmath.pi * k / n) for k in range(n)]
+    return table
+
+def _mixed_radix(x, factors, tw, stride):
+    """
+        FFT mixed-radix ricorsiva (Decimation-in-Time): x viene diviso in p sottosequenze
+        x[r::p] (p = primo fattore), trasformate ricorsivamente e ricombinate con
+        farfalle di ordine p. tw e' la tabella twiddle della dimensione di partenza,
+        stride il passo per la dimensione corrente.
+    """
+    n = len(x)
+    if n == 1:
+        return [x[0]]
+
+    p = factors[0]
+    m = n // p
+    subs = [_mixed_radix(x[r::p], factors[1:], tw, stride * p) for r in range(p)]
+    out = [0j] * n
+
+    if p == 2:
+        even, odd = subs
+        for k in range(m):
+            u = even[k]
+            v = odd[k] * tw[k * stride]
+            out[k] = u + v
+            out[k + m] = u - v
+        return out
+
+    # radici p-esime dell'unita': W_p^(r*q) = tw[(r*q mod p) * m * stride]
+    roots = [tw[j * m * stride] for j in range(p)]
+    for k in range(m):
+        t = [subs[r][k] * tw[r * k * stride] for r in range(p)]
+        for q in range(p):
+            acc = t[0]
+            for r in range(1, p):
+                acc += t[r] * roots[(r * q) % p]
+            out[k + q * m] = acc
+    return out
+
+def _bluestein(x):
+    """
+        FFT di lunghezza arbitraria con l'algoritmo chirp-z di Bluestein:
+        la DFT viene riscritta come convoluzione, calcolata con FFT Radix-2 di lunghezza M >= 2n-1
+    """
+    n = len(x)
+    plan = _BLUESTEIN_PLANS.get(n)
+    if plan is None:
+        M = 1
+        while M < 2 * n - 1:
+            M <<= 1
+        # chirp e^(-j*pi*k^2/n), k^2 ridotto modulo 2n per non perdere precisione
+        chirp = [cmath.exp(-1.0j * cmath.pi * ((k * k) % (2 * n)) / n) for k in range(n)]
+        b = [0j] * M
+        b[0] = chirp[0].conjugate()
+        for k in range(1, n):
+            b[k] = b[M - k] = chirp[k].conjugate()
+        plan = _BLUESTEIN_PLANS[n] = (chirp, fft(b), M)
+
+    chirp, b_fft, M = plan
+    a = [v * c for v, c in zip(x, chirp)] + [0j] * (M - n)
+    conv = [u * v for u, v in zip(fft(a), b_fft)]
+
+    # IFFT tramite coniugato: ifft(C) = conj(fft(conj(C))) / M
+    conv = fft([c.conjugate() for c in conv])
+    return [chirp[k] * conv[k].conjugate() / M for k in range(n)]
+
+def _radix2_cost(n):
+    return (n // 2) * (n.bit_length() - 1)
+
+def _direct_cost(n):
+    """ Costo stimato (moltiplicazioni complesse) della FFT di lunghezza n senza padding """
+    if _is_pow2(n):
+        return _radix2_cost(n), "radix2"
+    mixed = n * sum(p - 1 for p in _factorize(n))
+    M = 1
+    while M < 2 * n - 1:
+        M <<= 1
+    bluestein = 2 * _radix2_cost(M) + 2 * M + 2 * n            # FFT del filtro in cache
+    return (mixed, "mixed") if mixed <= bluestein else (bluestein, "bluestein")
+
+def fft_any(x):
+    """
+        FFT complessa di lunghezza arbitraria: Radix-2 se n e' potenza di 2,
+        altrimenti il meno costoso tra mixed-radix e Bluestein
+    """
+    n = len(x)
+    if n == 0:
+        return []
+    _, strategy = _direct_cost(n)
+    if strategy == "radix2":
+        return fft(list(x))
+    if strategy == "mixed":
+        return _mixed_radix(x, _factorize(n), _twiddle_table(n), 1)
+    return _bluestein(x)
+
+def choose_strategy(n, padding="auto"):
+    """
+        Strategia FFT per n campioni reali:
+            "radix2" (n potenza di 2), "pad" (padding alla potenza di 2),
+            "mixed" (mixed-radix), "bluestein" (chirp-z)
+        Con padding="auto" si sceglie la strategia meno costosa.
+    """
+    if _is_pow2(n) or n < 2:
+        return "radix2"
+    if padding is True:
+        return "pad"
+
+    # real-FFT: per n pari la trasformata complessa e' su n/2 punti
+    size = n // 2 if n % 2 == 0 else n
+    cost, strategy = _direct_cost(size)
+    if padding == "auto":
+        P = 1
+        while P < n:
+            P <<= 1
+        if _radix2_cost(P // 2) < cost:
+            return "pad"
+    return strategy
+
+def rfft(samples):
+    """
+        Real-FFT in puro Python: gli n campioni reali (n pari) vengono impacchettati
+        in n/2 complessi z[k] = x[2k] + j*x[2k+1], trasformati con fft() e separati:
+            E[k] = (Z[k] + conj(Z[n/2-k])) / 2          (FFT dei campioni pari)
+            O[k] = (Z[k] - conj(Z[n/2-k])) / 2j         (FFT dei campioni dispari)
+            X[k] = E[k] + e^(-j*2pi*k/n) * O[k]
+        Per n dispari si usa fft_any sull'intera sequenza.
+        Returns: meta' positiva dello spettro, n//2 + 1 bin (come np.fft.rfft)
+    """
+    n = len(samples)
+    if n < 2:
+        return [complex(v) for v in samples]
+    if n % 2:
+        return fft_any([complex(v) for v in samples])[:n // 2 + 1]
+
+    plan = get_real_plan(n)
+    h = n >> 1
+    z = [complex(re, im) for re, im in zip(samples[0::2], samples[1::2])]
+    z = fft(z, plan.half_plan) if plan.half_plan else fft_any(z)
+    z.append(z[0])                                      # Z[n/2] = Z[0] (periodicita')
+
+    res = []
+    for k, w in enumerate(plan.twiddles):
+        a = z[k]
+        b = z[h - k].conjugate()
+        res.append((a + b) * 0.5 + w * ((a - b) * -0.5j))
+    return res
+
+def resolve_backend(backend="auto"):
+    """
+        Risolve il nome del backend FFT ("auto", "numpy", "python").
+        Se numpy e' richiesto ma non installato si ripiega sul backend python.
+    """
+    if backend is None:
+        backend = "auto"
+    if backend not in BACKENDS:
+        raise ValueError(f"backend FFT sconosciuto: {backend}")
+    if backend == "python" or np is None:
+        return "python"
+    return "numpy"
+
+def full_spectrum(half, n):
+    """
+        Ricostruisce lo spettro completo (n bin) dalla meta' positiva (n//2 + 1 bin)
+        di un segnale reale, per simmetria coniugata: X[n-k] = conj(X[k])
+    """
+    return half + [half[k].conjugate() for k in range(n - len(half), 0, -1)]
+
+def _fft_numpy(samples):
+    """ Real-FFT con numpy, restituita nel layout a n bin del backend python """
+    n = len(samples)
+    half = np.fft.rfft(np.asarray(samples, dtype=float))
+    return full_spectrum(half.tolist(), n)
+
+
+def start_fft(samples, fs, backend="auto", padding="auto"):
     
     # 1. CENTRATURA
     samples_centered = remove_dc_component(samples)
     
-    # 2. PADDING potenza di 2
-    samples_padded = pad(samples_centered)
+    # 2. PADDING potenza di 2 (se richiesto o se conviene)
+    # stessa decisione per entrambi i backend: lunghezza e risoluzione dello spettro
+    # non dipendono dal backend scelto
+    backend = resolve_backend(backend)
+    do_pad = choose_strategy(len(samples_centered), padding) == "pad"
+    samples_padded = pad(samples_centered) if do_pad else samples_centered
     
     # 3. FFT
-    res = fft(samples_padded)
+    if backend == "numpy":
+        res = _fft_numpy(samples_padded)
+    else:
+        res = full_spectrum(rfft(samples_padded), len(samples_padded))
     
     res[0] = 0          # scarto dc
 
     return res          # da prendere portanti con get_peak
-   
-
-# def main():
-#     print(timeit.repeat(lambda:flow(), repeat= 5, number=1))
-
-# if __name__ == "__main__":
-#     main()
\ No newline at end of file
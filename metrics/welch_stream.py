@@ -0,0 +1,89 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from metrics.fft_iterativa import resolve_backend, rfft
+
+
+"""
+    metrics.welch_stream
+    Stima della PSD con il metodo di Welch, alimentata pacchetto per pacchetto durante la ricezione.
+
+    Ogni segmento (segment_len campioni, sovrapposizione overlap) viene trasformato appena completo:
+    in memoria restano solo i campioni del segmento in corso e la PSD media accumulata,
+    quindi la memoria dipende dalla lunghezza del segmento e non da quella dell'acquisizione.
+    Alla chiusura dello stream (D3) lo spettro e' gia' pronto.
+
+    Convenzioni (come scipy.signal.welch con i parametri di default):
+        - finestra di Hann periodica
+        - rimozione della media per segmento
+        - PSD monolatera in densita' (unita'^2/Hz)
+"""
+
+
+class StreamingWelch:
+    def __init__(self, fs, segment_len=1024, overlap=0.5, backend="auto"):
+        if segment_len < 2 or segment_len & (segment_len - 1):
+            raise ValueError("segment_len deve essere una potenza di 2")
+
+        self.fs = fs
+        self.segment_len = segment_len
+        self.step = segment_len - int(segment_len * overlap)       # avanzamento tra segmenti
+        self.backend = resolve_backend(backend)
+
+        self.window = [0.5 - 0.5 * math.cos(2 * math.pi * i / segment_len) for i in range(segment_len)]
+        self.scale = 1.0 / (fs * sum(w * w for w in self.window))
+
+        self._pending = []                                  # campioni del segmento in corso
+        self._psd_sum = [0.0] * (segment_len // 2 + 1)
+        self.segments = 0                                   # segmenti gia' mediati
+
+    def feed(self, samples):
+        """ Accoda i campioni di un pacchetto e trasforma i segmenti completati """
+        self._pending.extend(v for v in samples if math.isfinite(v))
+
+        while len(self._pending) >= self.segment_len:
+            self._add_segment(self._pending[:self.segment_len])
+            del self._pending[:self.step]
+
+    def _add_segment(self, segment):
+        mean = sum(segment) / len(segment)
+        windowed = [(x - mean) * w for x, w in zip(segment, self.window)]
+
+        if self.backend == "numpy":
+            spectrum = np.fft.rfft(windowed).tolist()
+        else:
+            spectrum = rfft(windowed)
+
+        last = len(spectrum) - 1
+        for k, c in enumerate(spectrum):
+            p = (c.real * c.real + c.imag * c.imag) * self.scale
+            if 0 < k < last:                                # monolatera: raddoppio esclusi DC e Nyquist
+                p *= 2
+            self._psd_sum[k] += p
+        self.segments += 1
+
+    def psd(self):
+        """ Returns: PSD media (segment_len/2 + 1 bin), None se nessun segmento completato """
+        if self.segments == 0:
+            return None
+        return [p / self.segments for p in self._psd_sum]
+
+    def frequencies(self):
+        return [k * self.fs / self.segment_len for k in range(self.segment_len // 2 + 1)]
+
+    def peak(self):
+        """ Returns: (frequenza, densita') del massimo della PSD esclusa la DC, None se vuota """
+        psd = self.psd()
+        if psd is None or len(psd) < 2:
+            return None
+        k = max(range(1, len(psd)), key=psd.__getitem__)
+        return k * self.fs / self.segment_len, psd[k]
+
+    def reset(self):
+        self._pending = []
+        self._psd_sum = [0.0] * (self.segment_len // 2 + 1)
+        self.segments = 0
@@ -1,4 +1,6 @@
 import ctypes
+import sys
+from array import array
 from datetime import datetime, timezone
 
 # Mappe per LETTURA (parsing package in ingresso)
@@ -53,28 +55,15 @@ class ProtocolDecoder:
         return 'a1' + ts_part
 
     @staticmethod
-    def build_config_packet(config_str, delay):
-        """ 
-            Genera il pacchetto di riconfigurazione (0xA2)
-            Prende la stringa di configurazione dal config.txt 
+    def build_config_fields(config_str):
+        """
+            Campi statici del pacchetto di riconfigurazione (0xA2), dopo il timestamp:
+            dipendono solo dalla stringa del config.txt, quindi possono essere calcolati una volta
+            per configurazione. Restituisce '' se i parametri sono insufficienti (fallback a sync1).
         """
-        t = datetime.now(timezone.utc)
-
-        ts_part = '%02d%02d%02d%02d%02d%02d%04x%02x' % (
-            int(str(t.year)[-2:]), t.month, t.day, t.hour, 55, t.second, 
-            int(t.microsecond / 1000), delay
-        )
-
-        # 0. Parte comune di timestamp e sync
-        # ts_part = '%02d%02d%02d%02d%02d%02d%04x%02x' % (
-        #     int(str(t.year)[-2:]), t.month, t.day, t.hour, t.minute, t.second, 
-        #     int(t.microsecond / 1000), delay
-        # )
-
-
         param = config_str.split(' ')
         if len(param) < 17:                     #fallback a sync1 se parametri insufficienti
-            return 'a1' + ts_part
+            return ''
 
         # Configurazione SHM
         acc = ProtocolDecoder.RANGE_MAP.get(param[0], 0x04)
@@ -104,13 +93,40 @@ class ProtocolDecoder:
         config_shm_sck = range_sck | acq_sck_odr | sck_ax | sck_datakb
         config_sck = sck_g | sck_freq | sck_bw | sck_pw
 
-        # 2. Formattazione stringa HEX 
-        # Formato: a2 + ts + shm(2b) + freq(1b) + shm_sck(2b) + sck_t(2b) + tresh(2b) + act(2b)
-        config_hex = 'a2' + ts_part + '%04x%02x%04x%04x%04x%04x%04x' % (
-            config_shm, send_frequency, config_shm_sck, 
+        # Formato: shm(2b) + freq(1b) + shm_sck(2b) + sck_t(2b) + tresh(2b) + act(2b)
+        return '%04x%02x%04x%04x%04x%04x%04x' % (
+            config_shm, send_frequency, config_shm_sck,
             config_sck, sck_t, thresh_acq, sample_activity
         )
 
+    @staticmethod
+    def build_config_packet(config_str, delay, fields=None):
+        """ 
+            Genera il pacchetto di riconfigurazione (0xA2)
+            Prende la stringa di configurazione dal config.txt 
+            fields: campi statici gia' calcolati con build_config_fields (opzionale)
+        """
+        t = datetime.now(timezone.utc)
+
+        ts_part = '%02d%02d%02d%02d%02d%02d%04x%02x' % (
+            int(str(t.year)[-2:]), t.month, t.day, t.hour, 55, t.second, 
+            int(t.microsecond / 1000), delay
+        )
+
+        # 0. Parte comune di timestamp e sync
+        # ts_part = '%02d%02d%02d%02d%02d%02d%04x%02x' % (
+        #     int(str(t.year)[-2:]), t.month, t.day, t.hour, t.minute, t.second, 
+        #     int(t.microsecond / 1000), delay
+        # )
+
+        if fields is None:
+            fields = ProtocolDecoder.build_config_fields(config_str)
+        if not fields:                          #fallback a sync1 se parametri insufficienti
+            return 'a1' + ts_part
+
+        # Formato: a2 + ts + campi statici
+        config_hex = 'a2' + ts_part + fields
+
         return config_hex
 
     @staticmethod
@@ -173,6 +189,59 @@ class ProtocolDecoder:
                 val = cls.decode_float_v2(raw_payload[i], raw_payload[i+1])
                 samples.append(f"{val + first_value:8.6f}")
         return samples
+
+    # Tabella di lookup half-float: 65536 valori, costruita al primo utilizzo
+    _HALF_TABLE = None
+
+    @classmethod
+    def _half_table(cls):
+        """
+            Restituisce la tabella hex_char -> float costruita con decode_float_v2,
+            cosi' il decoder bulk resta identico all'implementazione di riferimento.
+        """
+        if cls._HALF_TABLE is None:
+            cls._HALF_TABLE = [cls.decode_float_v2(h >> 8, h & 0xFF) for h in range(0x10000)]
+        return cls._HALF_TABLE
+
+    @classmethod
+    def decode_samples_bulk(cls, raw_payload, first_value=0.0):
+        """
+        Decodifica in un'unica chiamata una fetta di payload in campioni numerici.
+
+        Ogni coppia di byte (big-endian) viene usata come indice nella tabella
+        precalcolata dei 65536 half-float, l'offset first_value e' applicato in blocco.
+        Nessuna formattazione a stringa: va fatta solo dove il testo viene scritto
+        (vedi format_samples).
+
+        Args:
+            raw_payload (list | bytes): byte grezzi ricevuti dal sensore.
+            first_value (float, optional): offset da aggiungere a ogni campione. Default 0.0.
+
+        Returns:
+            list(float): campioni decodificati, stessi valori di decode_samples.
+
+        Nota:
+            - Come decode_samples ignora il byte finale se la lunghezza e' dispari.
+        """
+        n_bytes = len(raw_payload) & ~1
+        if n_bytes == 0:
+            return []
+
+        words = array('H', bytes(raw_payload[:n_bytes]))
+        if sys.byteorder == 'little':               # i sensori trasmettono in big-endian
+            words.byteswap()
+
+        table = cls._half_table()
+        if first_value:
+            return [table[w] + first_value for w in words]
+        return [table[w] for w in words]
+
+    @staticmethod
+    def format_samples(values):
+        """
+            Formatta i campioni nel formato testuale dei .log ("%8.6f;" per campione)
+        """
+        return ''.join([f"{v:8.6f};" for v in values])
     
     @staticmethod
     def parse_sync_info(p):
@@ -1,14 +1,35 @@
-from digidevice import xbee
+import queue
+import threading
+
+try:
+    from digidevice import xbee
+except ImportError:                     # fuori dal gateway Digi (replay, benchmark): nessuna radio
+    xbee = None
 
 class XBeeManager:
     """
         Classe responsabile per la gestione fisica e logica della rete radio XBee.
+        Con queue_size > 0 un thread dedicato legge i frame appena arrivano e li accoda
+        (coda limitata: se piena viene scartato il frame piu' vecchio), receive_data consuma dalla coda.
+        Contatori in get_stats(): frame ricevuti, scartati, profondita' attuale e massima della coda.
+        Con capture (utils.frame_capture.CaptureWriter) ogni frame viene registrato all'arrivo;
+        un errore di cattura non fa mai perdere il frame (contato in stats['capture_errors']).
     """
 
-    def __init__(self, timeout = 5):
+    READ_POLL = 0.5                                             # timeout di lettura del thread (s)
+
+    def __init__(self, timeout = 5, queue_size = 0, capture = None):
         self.device = None                                      # contiene: (MAC 64bit), (addr rete 16bit)
         self.network = None                                     # gestore della rete radio
         self.timeout = timeout
+        self.capture = capture                                  # registrazione dei frame (None = disattivata)
+
+        # lettura in background
+        self.queue_size = queue_size                            # 0 = lettura diretta in receive_data
+        self._frames = None                                     # coda (payload_bytes, addr)
+        self._reader = None
+        self._stop = threading.Event()
+        self.stats = {'received': 0, 'dropped': 0, 'high_water': 0, 'capture_errors': 0}
 
         # Rubrica: mac_stringa --> oggetto remote_device
         # STRUCT:
@@ -25,10 +46,19 @@ class XBeeManager:
             e inizializza la rete
         """
         try:
+            if xbee is None:
+                raise RuntimeError("modulo digidevice non disponibile")
             self.device = xbee.get_device()
             self.device.open()
             self.network = self.device.get_network()
             logger_callback("\t[Radio] Modulo Xbee avviato e rete inizializzata \n")
+
+            if self.queue_size > 0:
+                self._frames = queue.Queue(maxsize=self.queue_size)
+                self._stop.clear()
+                self._reader = threading.Thread(
+                    target=self._reader_loop, args=(logger_callback,), name="xbee-reader", daemon=True)
+                self._reader.start()
         except Exception as e:
             logger_callback(f"\t[Radio-ERROR] Impossibile avviare il modulo XBee: {str(e)}")
             raise               #sollevo eccezione (gw inutile)
@@ -38,6 +68,10 @@ class XBeeManager:
             Chiude la connessione
             da chiamare nel blocco finale del gw
         """
+        if self._reader is not None:
+            self._stop.set()
+            self._reader.join(self.READ_POLL * 4)
+            self._reader = None
         if self.device and self.device.is_open():
             try:
                 self.device.close()
@@ -53,26 +87,23 @@ class XBeeManager:
                 - Se arriva un pacchetto => prendo: MAC, aggiorno la rubrica e return
             Return: 
                 tuple: (payload_list, address_str, payload_raw_bytes)
+            Con il thread di lettura attivo il pacchetto viene preso dalla coda.
         """
+        if self._frames is not None:
+            try:
+                payload_bytes, addr = self._frames.get(timeout=self.timeout)
+            except queue.Empty:
+                return None, None, None
+            return list(payload_bytes), addr, payload_bytes
+
         try:
             xbee_message = self.device.read_data(timeout=self.timeout)
 
             if xbee_message is None:
                 return None, None, None
-            
-            remote_device = xbee_message.remote_device
-
-            # estrazione indirizzo MAC pulito
-            if hasattr(remote_device, 'get_64bit_addr'):
-                addr = str(remote_device.get_64bit_addr()).lower()
-            else:
-                addr = str(remote_device).lower().replace(" -", "").strip()
-
-            # salvo/aggiorno il dispositivo nella rubrica
-            self._known_devices[addr] = remote_device
-
-            payload_bytes = xbee_message.data
 
+            addr, payload_bytes = self._parse_message(xbee_message)
+            self._capture(addr, payload_bytes, logger_callback)
             return list(payload_bytes), addr, payload_bytes
         except Exception as e:
             # ignoro i timeout
@@ -80,6 +111,69 @@ class XBeeManager:
                 logger_callback(f"[Radio-ERRORE] errore in ricezione dati: {str(e)}")
             return None, None, None
     
+    def _parse_message(self, xbee_message):
+        """ Returns: (MAC, payload_bytes) e aggiorna la rubrica """
+        remote_device = xbee_message.remote_device
+
+        # estrazione indirizzo MAC pulito
+        if hasattr(remote_device, 'get_64bit_addr'):
+            addr = str(remote_device.get_64bit_addr()).lower()
+        else:
+            addr = str(remote_device).lower().replace(" -", "").strip()
+
+        # salvo/aggiorno il dispositivo nella rubrica
+        self._known_devices[addr] = remote_device
+
+        return addr, xbee_message.data
+
+    def _capture(self, addr, payload_bytes, logger_callback):
+        """ Registra il frame nella cattura, senza mai propagare errori al percorso di ricezione """
+        if self.capture is None:
+            return
+        try:
+            if not self.capture.write(addr, payload_bytes):
+                logger_callback(f"\t[Radio] Cattura frame terminata: limite di {self.capture.max_bytes / 1048576:g} MB\n")
+                self.capture = None
+        except Exception as e:
+            self.stats['capture_errors'] += 1
+            if self.stats['capture_errors'] == 1:              # un solo messaggio (es. disco pieno)
+                logger_callback(f"\t[Radio-ERROR] Errore nella cattura dei frame: {str(e)}\n")
+
+    def _reader_loop(self, logger_callback):
+        """ Thread di lettura: svuota la radio e accoda i frame """
+        while not self._stop.is_set():
+            try:
+                xbee_message = self.device.read_data(timeout=self.READ_POLL)
+                if xbee_message is None:
+                    continue
+                addr, payload_bytes = self._parse_message(xbee_message)
+                frame = (payload_bytes, addr)
+                self._capture(addr, payload_bytes, logger_callback)
+            except Exception as e:
+                # ignoro i timeout
+                if "timeout" not in str(e).lower():
+                    logger_callback(f"[Radio-ERRORE] errore in ricezione dati: {str(e)}")
+                continue
+
+            self.stats['received'] += 1
+            try:
+                self._frames.put_nowait(frame)
+            except queue.Full:
+                # coda piena: l'elaborazione non sta al passo, scarto il frame piu' vecchio
+                try:
+                    self._frames.get_nowait()
+                except queue.Empty:
+                    pass
+                self.stats['dropped'] += 1
+                self._frames.put_nowait(frame)
+            self.stats['high_water'] = max(self.stats['high_water'], self._frames.qsize())
+
+    def get_stats(self):
+        """ Contatori della coda di ricezione (depth = frame in attesa di elaborazione) """
+        stats = dict(self.stats)
+        stats['depth'] = self._frames.qsize() if self._frames is not None else 0
+        return stats
+
     def send_data(self, addr, hex_payload, logger_callback):
         """
             Invia il payload al sensore con l'indirizzo MAC specificatos
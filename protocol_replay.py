@@ -0,0 +1,136 @@
+import sys
+import time
+from datetime import datetime
+
+from GT_FFT_v5 import Gateway
+from utils.frame_capture import read_capture
+
+
+"""
+    protocol_replay:
+        Riproduzione di una sessione registrata (gateway.capture_file, utils.frame_capture)
+        con il gateway completo, senza modulo XBee (digidevice non necessario).
+        - ReplayXBeeManager sostituisce XBeeManager: i frame della cattura arrivano a process_data
+          con i tempi originali (speed 1), N volte piu' veloci (speed N) o senza attese (speed 0)
+        - gli invii verso i sensori (config, sync) sono registrati in ReplayXBeeManager.sent
+        - l'ora del gateway (Gateway.t, nomi dei file) e' quella registrata nella cattura
+          (ReplayXBeeManager.clock): a qualsiasi speed i file hanno i nomi della sessione originale,
+          senza collisioni tra acquisizioni riprodotte nello stesso secondo
+        - replay() misura il throughput: con speed 0 frame/s = massimo ritmo sostenibile del gateway,
+          con speed > 0 max_lag indica se il gateway resta al passo dei sensori
+
+    Uso: python protocol_replay.py <cattura> [gw_config.json] [speed]
+    Usare una configurazione di prova (data_dir, log, endpoint di upload) per non toccare i dati reali.
+"""
+
+
+class ReplayXBeeManager:
+    """ Stessa interfaccia di XBeeManager usata dal Gateway, frame letti da un file di cattura """
+
+    def __init__(self, path, speed=1.0, timeout=5, on_end=None):
+        self.path = path
+        self.speed = speed                      # 1 = tempo reale, N = N volte piu' veloce, 0 = senza attese
+        self.timeout = timeout                  # attesa massima per chiamata (come la radio vera)
+        self.on_end = on_end                    # chiamata a fine cattura (es. Gateway.stop)
+
+        self.sent = []                          # (s dall'inizio del replay, MAC, payload hex)
+        self.stats = {'received': 0, 'dropped': 0, 'high_water': 0}
+        self.max_lag = 0.0                      # ritardo massimo di consegna rispetto alla cattura (s)
+        self.started = None                     # perf_counter alla prima lettura
+        self.finished = None                    # perf_counter a fine cattura
+
+        self._frames = None
+        self._next = None
+        self._first_timestamp = None
+        self._last_time = None                  # ora dell'ultimo frame (clock a fine cattura)
+        self._known_devices = set()
+
+    def start(self, logger_callback):
+        self._frames = read_capture(self.path)
+        self._next = next(self._frames, None)
+        logger_callback(f"\t[Radio] Replay di {self.path} (speed {self.speed})\n")
+
+    def stop(self, logger_callback):
+        if self._frames is not None:
+            self._frames.close()
+            self._frames = None
+
+    def receive_data(self, logger_callback):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now                  # dopo start e warm-up del gateway
+
+        if self._next is None:
+            if self.finished is None:
+                self.finished = now
+                if self.on_end is not None:
+                    self.on_end()
+            return None, None, None
+
+        timestamp, addr, payload_bytes = self._next
+        if self.speed > 0:
+            if self._first_timestamp is None:
+                self._first_timestamp = timestamp
+            wait = self.started + (timestamp - self._first_timestamp) / self.speed - now
+            if wait > self.timeout:
+                time.sleep(self.timeout)        # nessun frame entro il timeout: giro a vuoto del loop
+                return None, None, None
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                self.max_lag = max(self.max_lag, -wait)
+
+        self._next = next(self._frames, None)
+        self._known_devices.add(addr)
+        self.stats['received'] += 1
+        return list(payload_bytes), addr, payload_bytes
+
+    def send_data(self, addr, hex_payload, logger_callback):
+        if addr not in self._known_devices:
+            logger_callback(f"\t[Radio-WARN] dispositivo non presente in rubrica: {addr}\n")
+            return False
+        self.sent.append((time.perf_counter() - self.started, addr, hex_payload))
+        return True
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['depth'] = 0
+        return stats
+
+    def clock(self):
+        """ Ora registrata del prossimo frame (Gateway.clock: letta prima di receive_data) """
+        if self._next is not None:
+            self._last_time = datetime.fromtimestamp(self._next[0])
+        return self._last_time or datetime.now()
+
+
+def replay(capture_path, config_path=Gateway.CONFIG_PATH, speed=0):
+    """
+        Esegue il gateway sulla cattura fino all'ultimo frame.
+        Returns: dict con frame elaborati, durata (s), frame/s, invii ai sensori e ritardo massimo (s)
+    """
+    radio = ReplayXBeeManager(capture_path, speed=speed)
+    gw = Gateway(config_path=config_path, xbee=radio, clock=radio.clock)
+    radio.on_end = gw.stop
+    gw.run()
+
+    elapsed = (radio.finished or time.perf_counter()) - (radio.started or time.perf_counter())
+    frames = radio.stats['received']
+    return {
+        "frames": frames,
+        "elapsed": elapsed,
+        "frames_per_s": frames / elapsed if elapsed > 0 else 0.0,
+        "sent": len(radio.sent),
+        "max_lag": radio.max_lag,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("uso: python protocol_replay.py <cattura> [gw_config.json] [speed]")
+        sys.exit(1)
+    result = replay(sys.argv[1],
+                    config_path=sys.argv[2] if len(sys.argv) > 2 else Gateway.CONFIG_PATH,
+                    speed=float(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    print(f"frame: {result['frames']}, durata: {result['elapsed']:.2f} s, "
+          f"{result['frames_per_s']:.0f} frame/s, invii: {result['sent']}, ritardo max: {result['max_lag']:.3f} s")
@@ -0,0 +1,10 @@
+import os
+import sys
+
+
+"""
+    Test del gateway: i moduli sono importati dalla cartella del gateway (come GT_FFT_v5.py),
+    anche lanciando pytest da un'altra cartella.
+"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,64 @@
+import time
+
+from utils.analysis_executor import AnalysisExecutor
+
+
+"""
+    tests.test_analysis_executor:
+        timeout misurato dall'avvio del job su un worker (non dalla messa in coda),
+        job bloccato isolato e attesa limitata di wait().
+"""
+
+
+def nap(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+def drain(executor, deadline=30):
+    outcomes = []
+    limit = time.monotonic() + deadline
+    while executor.pending() and time.monotonic() < limit:
+        outcomes.extend(executor.poll())
+        time.sleep(0.02)
+    return sorted(outcomes, key=lambda o: o[1])
+
+
+def test_queued_jobs_do_not_time_out():
+    # tre job da 0.6 s su un worker con timeout 1 s: in coda aspettano fino a 1.2 s, ma non scadono
+    executor = AnalysisExecutor(workers=1, timeout=1.0)
+    try:
+        for i in range(3):
+            executor.submit("a", nap, (0.6, i), context=i)
+        outcomes = drain(executor)
+        assert [(ok, value) for _, _, ok, value in outcomes] == [(True, 0), (True, 1), (True, 2)]
+        assert executor.restarts == 0
+    finally:
+        executor.shutdown()
+
+
+def test_stuck_job_fails_alone():
+    executor = AnalysisExecutor(workers=1, timeout=0.5)
+    try:
+        executor.submit("a", nap, (30, "bloccato"), context=0)
+        executor.submit("b", nap, (0.05, "ok"), context=1)
+        outcomes = drain(executor)
+        assert [ok for _, _, ok, _ in outcomes] == [False, True]
+        assert outcomes[1][3] == "ok"
+        assert executor.restarts == 1
+    finally:
+        executor.shutdown()
+
+
+def test_wait_is_bounded():
+    executor = AnalysisExecutor(workers=1, timeout=30)
+    try:
+        executor.submit("a", nap, (0.05, "primo"), context=0)
+        executor.submit("b", nap, (5, "lento"), context=1)
+        start = time.monotonic()
+        outcomes = executor.wait("b", max_wait=0.5)
+        assert time.monotonic() - start < 2
+        assert [value for _, _, _, value in outcomes] == ["primo"]
+        assert executor.pending("b")
+    finally:
+        executor.shutdown()
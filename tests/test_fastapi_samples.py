@@ -0,0 +1,77 @@
+import math
+import random
+
+import pytest
+
+from utils.fastapi_manager import encode_samples_field, decode_samples_field
+
+
+"""
+    tests.test_fastapi_samples:
+        round trip del campo "samples" del payload FastAPI (encode_samples_field -> decode_samples_field)
+        per tutte le codifiche di samples_encoding.
+"""
+
+
+def vibration(n=2048, baseline=0.987, amplitude=0.002, seed=3):
+    """ Asse verticale: ~1 g di gravita' con una piccola vibrazione """
+    rnd = random.Random(seed)
+    return [baseline + amplitude * math.sin(2 * math.pi * 0.031 * i) + rnd.gauss(0, amplitude / 10)
+            for i in range(n)]
+
+
+def roundtrip(samples, encoding):
+    field, fmt = encode_samples_field(samples, encoding)
+    payload = {"samples": field}
+    if fmt is not None:
+        payload["samples_format"] = fmt
+    return decode_samples_field(payload), fmt
+
+
+def test_json_unchanged():
+    samples = vibration()
+    decoded, fmt = roundtrip(samples, "json")
+    assert fmt is None
+    assert decoded == samples
+
+
+def test_f4_float32_precision():
+    samples = vibration()
+    decoded, fmt = roundtrip(samples, "f4")
+    assert (fmt["dtype"], fmt["scale"], fmt["offset"], fmt["count"]) == ("f4", 1.0, 0.0, len(samples))
+    assert decoded == pytest.approx(samples, rel=1e-7)
+
+
+@pytest.mark.parametrize("baseline, amplitude", [(0.987, 0.002), (-1.0, 0.0005), (0.0, 0.5), (0.02, 1e-5)])
+def test_f2_keeps_vibration(baseline, amplitude):
+    samples = vibration(baseline=baseline, amplitude=amplitude)
+    decoded, fmt = roundtrip(samples, "f2")
+    assert fmt["dtype"] == "f2" and fmt["count"] == len(samples)
+    # errore float16 relativo all'ampiezza di vibrazione, non alla baseline
+    peak = max(abs(v - fmt["offset"]) for v in samples)
+    assert max(abs(a - b) for a, b in zip(decoded, samples)) <= peak * 2 ** -11
+
+
+def test_f2_constant_signal():
+    decoded, fmt = roundtrip([1.25] * 16, "f2")
+    assert fmt["dtype"] == "f2"
+    assert decoded == [1.25] * 16
+
+
+def test_f2_non_finite_falls_back_to_f4():
+    samples = [0.5, float("inf"), -0.5]
+    decoded, fmt = roundtrip(samples, "f2")
+    assert fmt["dtype"] == "f4"
+    assert decoded == samples
+
+
+def test_empty_samples():
+    for encoding in ("f2", "f4"):
+        decoded, fmt = roundtrip([], encoding)
+        assert decoded == [] and fmt["count"] == 0
+
+
+def test_legacy_format_without_offset():
+    field, fmt = encode_samples_field([1.0, 2.0], "f4")
+    del fmt["offset"]
+    assert decode_samples_field({"samples": field, "samples_format": fmt}) == [1.0, 2.0]
@@ -0,0 +1,49 @@
+import math
+import random
+
+import pytest
+
+from metrics.fft_iterativa import start_fft, np
+from utils.get_peak_prominence import get_top_peaks_prominence
+from utils.get_peak_resolution import get_top_peaks_resolution
+
+
+"""
+    tests.test_fft_backends:
+        i backend "python" e "numpy" di start_fft devono restituire lo stesso spettro (stessa lunghezza,
+        stessi valori a meno dell'arrotondamento) e quindi gli stessi picchi con entrambi i peak detector.
+        Saltati se numpy non e' installato.
+"""
+
+pytestmark = pytest.mark.skipif(np is None, reason="numpy non installato")
+
+MODES = ((0.0256, 1.0), (0.0632, 0.6), (0.1232, 0.3))
+
+
+def signal(n, fs, seed):
+    rnd = random.Random(seed)
+    return [sum(a * math.sin(2 * math.pi * r * i) for r, a in MODES) + rnd.gauss(0, 0.02)
+            for i in range(n)]
+
+
+@pytest.mark.parametrize("n", [2048, 4096, 8192, 16384, 100, 1000, 2310, 3000, 8193])
+@pytest.mark.parametrize("padding", ["auto", True, False])
+def test_same_spectrum(n, padding):
+    samples = signal(n, 125.0, n)
+    res_python = start_fft(samples, 125.0, "python", padding)
+    res_numpy = start_fft(samples, 125.0, "numpy", padding)
+    assert len(res_python) == len(res_numpy)
+    scale = max(abs(v) for v in res_numpy)
+    assert max(abs(a - b) for a, b in zip(res_python, res_numpy)) <= 1e-9 * scale
+
+
+@pytest.mark.parametrize("n, fs", [(2048, 31.25), (4096, 125.0), (8192, 500.0), (3000, 62.5)])
+@pytest.mark.parametrize("detector", [get_top_peaks_prominence, get_top_peaks_resolution])
+def test_same_peaks(n, fs, detector):
+    samples = signal(n, fs, 7)
+    peaks_python = detector(start_fft(samples, fs, "python"), fs)
+    peaks_numpy = detector(start_fft(samples, fs, "numpy"), fs)
+    assert peaks_python
+    assert [p["idx"] for p in peaks_python] == [p["idx"] for p in peaks_numpy]
+    assert [p["freq"] for p in peaks_python] == [p["freq"] for p in peaks_numpy]
+    assert [p["mag"] for p in peaks_python] == pytest.approx([p["mag"] for p in peaks_numpy], rel=1e-9)
@@ -0,0 +1,88 @@
+import math
+import random
+
+import pytest
+
+from metrics.fft_iterativa import start_fft
+from utils import get_peak_prominence
+from utils.get_peak_prominence import calculate_prominences, get_top_peaks_prominence
+
+
+"""
+    tests.test_peak_prominence:
+        calculate_prominences (stack monotono, tutti i massimi locali in tempo lineare) deve
+        restituire le stesse prominence della scansione per picco originale (calculate_prominence),
+        riportata qui come riferimento, e le valli trovate da quella scansione.
+"""
+
+
+def reference_prominence(magnitudes, peak_idx):
+    """ Scansione originale per picco, con l'indice della valle (minimo piu' vicino) per lato """
+    peak_mag = magnitudes[peak_idx]
+
+    min_left, idx_left = peak_mag, peak_idx
+    for i in range(peak_idx - 1, -1, -1):
+        if magnitudes[i] > peak_mag:
+            break
+        if magnitudes[i] < min_left:
+            min_left, idx_left = magnitudes[i], i
+
+    min_right, idx_right = peak_mag, peak_idx
+    for j in range(peak_idx + 1, len(magnitudes)):
+        if magnitudes[j] > peak_mag:
+            break
+        if magnitudes[j] < min_right:
+            min_right, idx_right = magnitudes[j], j
+
+    return peak_mag - max(min_left, min_right), idx_left, idx_right
+
+
+def reference_prominences(magnitudes):
+    return {j: reference_prominence(magnitudes, j) for j in range(1, len(magnitudes) - 1)
+            if magnitudes[j] > magnitudes[j-1] and magnitudes[j] > magnitudes[j+1]}
+
+
+def arrays():
+    """ (nome, magnitudi) di prova: plateau, bordi, altezze uguali, rumore quantizzato """
+    rnd = random.Random(11)
+    cases = [
+        ("vuoto", []),
+        ("un_valore", [1.0]),
+        ("monotono", [float(i) for i in range(20)]),
+        ("altezze_uguali", [0, 5, 1, 5, 1, 5, 0, 5, 2, 5, 0]),
+        ("plateau", [0, 3, 3, 1, 4, 4, 4, 2, 4, 1, 1, 1, 5, 5, 0]),
+        ("picchi_ai_bordi", [9, 1, 3, 1, 2, 1, 9]),
+        ("valli_uguali", [6, 1, 4, 1, 5, 1, 4, 1, 6]),
+        ("pettine_decrescente", [v for k in range(50, 0, -1) for v in (k, 0)]),
+    ]
+    for i in range(200):
+        # valori interi piccoli: molti plateau e parita'
+        cases.append((f"interi_{i}", [rnd.randint(0, 6) for _ in range(rnd.randint(3, 60))]))
+    for i in range(20):
+        cases.append((f"rumore_{i}", [abs(rnd.gauss(0, 1)) for _ in range(500)]))
+    return cases
+
+
+@pytest.mark.parametrize("name, magnitudes", arrays(), ids=[name for name, _ in arrays()])
+def test_matches_per_peak_scan(name, magnitudes):
+    assert calculate_prominences(magnitudes) == reference_prominences(magnitudes)
+
+
+def test_module_calculate_prominence_unchanged():
+    for _, magnitudes in arrays():
+        for j, (prominence, _, _) in reference_prominences(magnitudes).items():
+            assert get_peak_prominence.calculate_prominence(magnitudes, j) == prominence
+
+
+@pytest.mark.parametrize("n, fs", [(2048, 125.0), (8192, 31.25), (3000, 500.0)])
+def test_top_peaks_unchanged(monkeypatch, n, fs):
+    rnd = random.Random(n)
+    samples = [sum(a * math.exp(-0.002 * i) * math.sin(2 * math.pi * r * i) for r, a in
+                   ((0.0256, 1.0), (0.0632, 0.6), (0.0660, 0.5), (0.1232, 0.3)))
+               + rnd.gauss(0, 0.05) for i in range(n)]
+    res_fft = start_fft(samples, fs, "python")
+    peaks = get_top_peaks_prominence(res_fft, fs)
+
+    monkeypatch.setattr(get_peak_prominence, "calculate_prominences", reference_prominences)
+    assert peaks
+    assert peaks == get_top_peaks_prominence(res_fft, fs)
@@ -0,0 +1,54 @@
+import math
+
+import pytest
+
+from metrics.fft_iterativa import start_fft, np
+from utils.get_peak_resolution import get_top_peaks_resolution
+from utils.peak_refine import refine_peaks, zoom_band
+
+
+"""
+    tests.test_peak_refine:
+        - i backend numpy (DTFT a blocchi) e python (Goertzel) di zoom_band / refine_peaks coincidono
+        - lo smorzamento di un modo in decadimento libero e' stimato per ogni dimensione di acquisizione
+        - una sinusoide pura (larghezza = lobo della finestra) non ha smorzamento misurabile
+"""
+
+FS = 125.0
+BACKENDS = ["python"] + (["numpy"] if np is not None else [])
+
+
+def free_decay(n, zeta, f=7.3):
+    w = 2 * math.pi * f
+    return [math.exp(-zeta * w * i / FS) * math.sin(w * math.sqrt(1 - zeta ** 2) * i / FS) for i in range(n)]
+
+
+def refine(samples, backend):
+    res_fft = start_fft(samples, FS, backend)
+    return refine_peaks(samples, FS, len(res_fft), get_top_peaks_resolution(res_fft, FS, 1), backend=backend)
+
+
+@pytest.mark.skipif(np is None, reason="numpy non installato")
+@pytest.mark.parametrize("n", [2048, 3000, 16384])
+def test_zoom_band_backends_match(n):
+    samples = free_decay(n, 0.01)
+    _, mags_python = zoom_band(samples, FS, 7.0, 7.6, 9, "python")
+    _, mags_numpy = zoom_band(samples, FS, 7.0, 7.6, 9, "numpy")
+    assert mags_numpy == pytest.approx(mags_python, rel=1e-9)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("n", [2048, 8192, 16384])
+@pytest.mark.parametrize("zeta", [0.005, 0.01, 0.03])
+def test_damping_free_decay(backend, n, zeta):
+    (peak,) = refine(free_decay(n, zeta), backend)
+    assert peak["freq"] == pytest.approx(7.3, abs=0.01)
+    assert peak["damping"] == pytest.approx(zeta * 100, rel=0.1)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_pure_sine_has_no_damping(backend):
+    samples = [math.sin(2 * math.pi * 7.3 * i / FS) for i in range(8192)]
+    (peak,) = refine(samples, backend)
+    assert peak["freq"] == pytest.approx(7.3, abs=1e-3)
+    assert peak["damping"] is None
@@ -0,0 +1,93 @@
+import math
+import random
+import statistics
+
+import pytest
+
+from metrics.fft_iterativa import start_fft
+from utils.get_peak_resolution import get_top_peaks_resolution, resolution
+
+
+"""
+    tests.test_peak_resolution:
+        get_top_peaks_resolution (estrazione in un'unica passata con heap e zone escluse) deve
+        restituire gli stessi picchi della versione iterativa originale, riportata qui come
+        riferimento, su spettri di prova.
+"""
+
+
+def reference_peaks_resolution(fft_res, fs, k=5):
+    """ Versione iterativa originale: ricerca del massimo e azzeramento del 2% a ogni picco """
+    n = len(fft_res)
+    half_len = n // 2
+
+    magnitudes = [abs(fft_res[i]) for i in range(half_len)]
+    frequencies = [i * (fs / n) for i in range(half_len)]
+
+    avg = statistics.mean(magnitudes)
+    std = statistics.stdev(magnitudes)
+    threshold = avg + 2 * std
+
+    peaks = []
+    while len(peaks) < k:
+        max_val = -1
+        max_idx = -1
+        for j in range(1, half_len - 1):
+            if magnitudes[j] > magnitudes[j-1] and magnitudes[j] > magnitudes[j+1]:
+                if magnitudes[j] > max_val and magnitudes[j] > threshold:
+                    max_val = magnitudes[j]
+                    max_idx = j
+
+        freq = max_idx * (fs/n)
+        if max_idx == -1:
+            break
+        if all(resolution(magnitudes, p["idx"], max_idx) >= 1.5 for p in peaks):
+            peaks.append({"freq": freq, "mag": max_val, "idx": max_idx})
+
+        distance = frequencies[2] - frequencies[1]
+        campioni_da_scartare = round((freq * 0.02) / distance)
+        start = max(0, max_idx - campioni_da_scartare)
+        end = min(half_len, max_idx + campioni_da_scartare + 1)
+        for j in range(start, end):
+            magnitudes[j] = 0
+    return peaks
+
+
+def modes_signal(n, fs, modes, noise, seed):
+    rnd = random.Random(seed)
+    return [sum(a * math.sin(2 * math.pi * f * i / fs) for f, a in modes) + rnd.gauss(0, noise)
+            for i in range(n)]
+
+
+def spectra():
+    """ (nome, spettro, fs) di prova """
+    rnd = random.Random(12)
+    cases = [
+        ("tre_modi", modes_signal(2048, 125.0, ((3.2, 1.0), (7.9, 0.6), (15.4, 0.3)), 0.02, 1), 125.0),
+        ("modi_vicini", modes_signal(4096, 62.5, ((4.0, 1.0), (4.1, 0.9), (4.35, 0.8), (9.0, 0.5)), 0.05, 2), 62.5),
+        ("galleria", modes_signal(8192, 250.0, ((1.1, 0.2), (2.3, 1.0), (2.4, 0.4), (30.0, 0.7),
+                                                (31.0, 0.7), (60.5, 0.1)), 0.1, 3), 250.0),
+        ("solo_rumore", [rnd.gauss(0, 1) for _ in range(2048)], 500.0),
+        ("lunghezza_non_pow2", modes_signal(3000, 31.25, ((2.0, 1.0), (5.5, 0.5)), 0.03, 4), 31.25),
+    ]
+    return [(name, start_fft(samples, fs, "python"), fs) for name, samples, fs in cases]
+
+
+@pytest.mark.parametrize("name, fft_res, fs", spectra(), ids=lambda v: v if isinstance(v, str) else "")
+@pytest.mark.parametrize("k", [1, 3, 5, 12])
+def test_matches_iterative_algorithm(name, fft_res, fs, k):
+    peaks = get_top_peaks_resolution(fft_res, fs, k)
+    expected = reference_peaks_resolution(fft_res, fs, k)
+    assert [(p["idx"], p["freq"]) for p in peaks] == [(p["idx"], p["freq"]) for p in expected]
+    # magnitudi da compute_features: stesso valore a meno dell'arrotondamento
+    assert [p["mag"] for p in peaks] == pytest.approx([p["mag"] for p in expected], rel=1e-12)
+
+
+def test_equal_magnitudes_lowest_index_first():
+    # a parita' di magnitudo la versione iterativa tiene il primo massimo (indice minore)
+    fft_res = [0j] * 256
+    for idx in (40, 20, 90, 60):
+        fft_res[idx] = 10 + 0j
+    peaks = get_top_peaks_resolution(fft_res, 256.0, 3)
+    assert [p["idx"] for p in peaks] == [p["idx"] for p in reference_peaks_resolution(fft_res, 256.0, 3)]
+    assert [p["idx"] for p in peaks] == [20, 40, 60]
@@ -0,0 +1,52 @@
+import math
+
+import pytest
+
+from protocol_decoder import ProtocolDecoder
+
+
+"""
+    tests.test_protocol_decoder:
+        decode_samples_bulk (tabella half-float) deve restituire gli stessi campioni
+        di decode_samples (decode_float_v2 per ogni coppia di byte).
+"""
+
+ALL_CODES = [b for h in range(0x10000) for b in (h >> 8, h & 0xFF)]
+
+
+def _same(a, b):
+    return (math.isnan(a) and math.isnan(b)) or a == b
+
+
+def test_half_table_matches_decode_float_v2():
+    table = ProtocolDecoder._half_table()
+    assert len(table) == 0x10000
+    for h in range(0x10000):
+        assert _same(table[h], ProtocolDecoder.decode_float_v2(h >> 8, h & 0xFF)), hex(h)
+
+
+@pytest.mark.parametrize("first_value", [0.0, 1.0, -0.987654, 1e-4, 250.5])
+def test_bulk_matches_decode_samples_all_codes(first_value):
+    bulk = ProtocolDecoder.decode_samples_bulk(ALL_CODES, first_value)
+    reference = ProtocolDecoder.decode_samples(ALL_CODES, first_value)
+    assert len(bulk) == len(reference) == 0x10000
+    assert ProtocolDecoder.format_samples(bulk) == ''.join(s + ';' for s in reference)
+
+
+def test_bulk_values_all_codes():
+    bulk = ProtocolDecoder.decode_samples_bulk(bytes(ALL_CODES), 0.5)
+    for h, value in enumerate(bulk):
+        assert _same(value, ProtocolDecoder.decode_float_v2(h >> 8, h & 0xFF) + 0.5), hex(h)
+
+
+@pytest.mark.parametrize("payload", [[0x3C], [0x3C, 0x00, 0xBC], list(range(1, 200, 2)) + [7]])
+def test_bulk_odd_length_ignores_last_byte(payload):
+    bulk = ProtocolDecoder.decode_samples_bulk(payload, 0.25)
+    reference = ProtocolDecoder.decode_samples(payload, 0.25)
+    assert len(bulk) == len(reference) == len(payload) // 2
+    assert [f"{v:8.6f}" for v in bulk] == reference
+
+
+def test_bulk_empty_payload():
+    assert ProtocolDecoder.decode_samples_bulk([]) == []
+    assert ProtocolDecoder.decode_samples_bulk(b"") == []
@@ -0,0 +1,273 @@
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from utils.load_data import parse_metadata
+
+
+"""
+    utils.acq_binary:
+        Formato binario compatto per le acquisizioni, alternativo ai .log testuali separati da ';'.
+        Un campione occupa 2 (float16) o 4 (float32) byte invece dei ~9 byte del testo.
+
+    Struttura del file (.bin, little-endian):
+        - HEADER a dimensione fissa (HEADER_SIZE byte):
+            magic "APDB" | versione | dtype | flags |
+            time | range | odr | asse | sync                (stringhe ascii, padding con \\x00)
+            temperature | rms_x | rms_y | rms_z | humidity  (double, riga 2 del .log)
+            first_x | first_y | first_z                     (double, riga 3 del .log)
+        - CAMPIONI grezzi in coda all'header, appendibili pacchetto per pacchetto.
+          Il numero di campioni si ricava dalla dimensione del file.
+        - con FLAG_OFFSET (sempre per "f2") i campioni sono salvati al netto della baseline dell'asse
+          (first_x/y/z secondo l'asse dell'header), sommata di nuovo in lettura: vicino a 1 g il
+          float16 risolve solo ~5e-4 g, sulle sole oscillazioni la precisione resta ~1e-6 g
+        - i file aperti senza D1 (chiusura anomala) restano sempre in formato testuale (.log):
+          un .bin ha sempre un header completo
+
+    I campioni si leggono senza parsing tramite mmap (o numpy.memmap se disponibile).
+
+    Functions
+    ---------
+    encode_header(header, mean_vals, humidity, baselines, dtype):
+        restituisce i byte dell'header (stessi campi scritti da process_start_stream)
+    encode_samples(values, dtype, offset):
+        restituisce i byte dei campioni (al netto di offset), da appendere al file
+    axis_offset(baselines, axis_file, dtype):
+        offset dei campioni del file (baseline dell'asse per "f2", altrimenti 0)
+    load_sensor_bin(filepath):
+        legge un .bin e restituisce lo stesso dict di utils.load_data.load_sensor
+    memmap_samples(filepath):
+        vista dei campioni senza copia (numpy.memmap se disponibile, altrimenti mmap)
+    log_to_bin(src, dst, dtype) / bin_to_log(src, dst):
+        convertitori tra i due formati (i consumer FTP continuano a ricevere .log)
+"""
+
+BIN_EXT = ".bin"
+MAGIC = b"APDB"
+VERSION = 1
+
+# codice dtype => (formato struct, dimensione in byte)
+DTYPES = {"f2": (0, "e", 2), "f4": (1, "f", 4)}
+_DTYPE_BY_CODE = {code: name for name, (code, _, _) in DTYPES.items()}
+
+FLAG_OFFSET = 0x02                      # campioni al netto della baseline dell'asse
+
+_AXIS_INDEX = {"X axis": 0, "Y axis": 1, "Z axis": 2}      # axis_file -> baseline (default X, come il gateway)
+
+_HEADER_STRUCT = struct.Struct("<4sBBH12s8s12s16s12s8d")
+HEADER_SIZE = _HEADER_STRUCT.size
+
+
+def _str_field(value):
+    return str(value).encode("ascii", "replace")
+
+def _read_str(raw):
+    return raw.rstrip(b"\x00").decode("ascii", "replace")
+
+
+def axis_offset(baselines, axis_file, dtype):
+    """ Offset sottratto ai campioni in scrittura: baseline dell'asse per "f2", 0 per "f4" """
+    if dtype != "f2":
+        return 0.0
+    return float(baselines[_AXIS_INDEX.get(axis_file.strip(), 0)])
+
+
+def encode_header(header, mean_vals, humidity, baselines, dtype="f4", flags=0):
+    """
+        Per "f2" imposta FLAG_OFFSET: i campioni vanno scritti con
+        encode_samples(values, "f2", axis_offset(baselines, header["axis_file"], "f2"))
+        Params:
+            - header: dict di ProtocolDecoder.parse_start_header (time, range, odr, axis_file, sync)
+            - mean_vals: temperatura e rms x/y/z (4 float)
+            - humidity: ultima umidita' nota per il sensore
+            - baselines: first_x, first_y, first_z
+            - dtype: "f2" o "f4"
+        Returns:
+            - bytes dell'header (HEADER_SIZE)
+    """
+    code = DTYPES[dtype][0]
+    if dtype == "f2":
+        flags |= FLAG_OFFSET
+    temp, rms_x, rms_y, rms_z = (float(v) for v in mean_vals[:4])
+    return _HEADER_STRUCT.pack(
+        MAGIC, VERSION, code, flags,
+        _str_field(header["time"]), _str_field(header["range"]), _str_field(header["odr"]),
+        _str_field(header["axis_file"]), _str_field(header["sync"]),
+        temp, rms_x, rms_y, rms_z, float(humidity),
+        float(baselines[0]), float(baselines[1]), float(baselines[2])
+    )
+
+
+def encode_samples(values, dtype="f4", offset=0.0):
+    """ Codifica i campioni (float, al netto di offset) nei byte da appendere al file """
+    if offset:
+        values = [v - offset for v in values]
+    if dtype == "f2":
+        return struct.pack("<%de" % len(values), *values)
+
+    buf = array("f", values)
+    if sys.byteorder != "little":
+        buf.byteswap()
+    return buf.tobytes()
+
+
+def read_header(filepath):
+    """
+        Legge l'header di un file .bin.
+        Returns: dict con i campi grezzi oppure None se il file non e' valido
+    """
+    with open(filepath, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        return None
+
+    fields = _HEADER_STRUCT.unpack(raw)
+    if fields[0] != MAGIC or fields[2] not in _DTYPE_BY_CODE:
+        return None
+
+    return {
+        "version": fields[1],
+        "dtype": _DTYPE_BY_CODE[fields[2]],
+        "flags": fields[3],
+        "time": _read_str(fields[4]),
+        "range": _read_str(fields[5]),
+        "odr": _read_str(fields[6]),
+        "axis_file": _read_str(fields[7]),
+        "sync": _read_str(fields[8]),
+        "summary": fields[9:14],
+        "baselines": fields[14:17],
+        "offset": axis_offset(fields[14:17], _read_str(fields[7]), _DTYPE_BY_CODE[fields[2]])
+                  if fields[3] & FLAG_OFFSET else 0.0,
+    }
+
+
+def _read_samples(filepath, dtype, offset=0.0):
+    """ Legge tutti i campioni del file tramite mmap (nessun parsing testuale), offset riaggiunto """
+    _, fmt, size = DTYPES[dtype]
+    with open(filepath, "rb") as f:
+        n = (os.fstat(f.fileno()).st_size - HEADER_SIZE) // size
+        if n <= 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if fmt == "f" and sys.byteorder == "little":
+                buf = array("f")
+                buf.frombytes(mm[HEADER_SIZE:HEADER_SIZE + n * size])
+                values = buf.tolist()
+            else:
+                values = list(struct.unpack_from("<%d%s" % (n, fmt), mm, HEADER_SIZE))
+    if offset:
+        return [v + offset for v in values]
+    return values
+
+
+def memmap_samples(filepath):
+    """
+        Vista dei campioni senza parsing.
+        Returns: numpy.memmap se numpy e' disponibile (array con la baseline riaggiunta se il file
+        ha FLAG_OFFSET), altrimenti lista di float letta via mmap
+    """
+    head = read_header(filepath)
+    if head is None:
+        return None
+    try:
+        import numpy as np
+    except ImportError:
+        return _read_samples(filepath, head["dtype"], head["offset"])
+    view = np.memmap(filepath, dtype="<" + head["dtype"], mode="r", offset=HEADER_SIZE)
+    if head["offset"]:
+        return view.astype(np.float64) + head["offset"]         # float16 + baseline in float64
+    return view
+
+
+def load_sensor_bin(filepath):
+    """
+        Equivalente binario di load_sensor: stesso dict in uscita
+        (i valori non finiti vengono scartati come nel parser testuale)
+    """
+    head = read_header(filepath)
+    if head is None:
+        return None
+
+    metadata = parse_metadata(
+        [head["time"], head["range"], head["odr"], head["axis_file"]], head["sync"]
+    )
+    temp, rms_x, rms_y, rms_z, hum = head["summary"]
+    first_x, first_y, first_z = head["baselines"]
+    summary = {
+        "temperature": temp, "rms_x": rms_x, "rms_y": rms_y, "rms_z": rms_z, "humidity": hum,
+        "first_x": first_x, "first_y": first_y, "first_z": first_z
+    }
+    samples = [v for v in _read_samples(filepath, head["dtype"], head["offset"]) if math.isfinite(v)]
+
+    return {"metadata": metadata, "summary": summary, "samples": samples}
+
+
+def bin_to_log_text(src):
+    """ Ricostruisce il contenuto testuale (.log) di un file .bin """
+    head = read_header(src)
+    if head is None:
+        return None
+
+    lines = [
+        f"{head['time']};{head['range']};{head['odr']};{head['axis_file']};\n",
+        f"{head['sync']};\n",
+        "".join(f"{v};" for v in head["summary"]) + "\n",
+        "".join(f"{v};" for v in head["baselines"]) + "\n",
+        "".join(f"{v:8.6f};" for v in _read_samples(src, head["dtype"], head["offset"])),
+    ]
+    return "".join(lines)
+
+
+def bin_to_log(src, dst=None):
+    """ Converte un .bin nel formato testuale; restituisce il path del .log creato """
+    text = bin_to_log_text(src)
+    if text is None:
+        return None
+    dst = dst or src[:-len(BIN_EXT)] + ".log"
+    with open(dst, "w") as f:
+        f.write(text)
+    return dst
+
+
+def log_to_bin(src, dst=None, dtype="f4"):
+    """ Converte un .log testuale nel formato binario; restituisce il path del .bin creato """
+    with open(src, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    if len(lines) < 4:
+        return None
+
+    head = lines[0].strip().split(";")
+    header = {
+        "time": head[0], "range": head[1], "odr": head[2], "axis_file": head[3],
+        "sync": lines[1].strip().replace(";", "")
+    }
+    summary = [float(v) for v in lines[2].strip().split(";") if v]
+    baselines = [float(v) for v in lines[3].strip().split(";") if v]
+
+    samples = []
+    for line in lines[4:]:
+        for data in line.strip().split(";"):
+            try:
+                samples.append(float(data))
+            except ValueError:
+                continue                # marker (* MISSING PACKETS ... *) e campi vuoti
+
+    dst = dst or os.path.splitext(src)[0] + BIN_EXT
+    with open(dst, "wb") as f:
+        f.write(encode_header(header, summary[:4], summary[4], baselines, dtype))
+        f.write(encode_samples(samples, dtype, axis_offset(baselines, header["axis_file"], dtype)))
+    return dst
+
+
+if __name__ == "__main__":
+    # uso: python -m utils.acq_binary to-bin|to-log <file> [f2|f4]
+    if len(sys.argv) < 3 or sys.argv[1] not in ("to-bin", "to-log"):
+        print("uso: python -m utils.acq_binary to-bin|to-log <file> [f2|f4]")
+        sys.exit(1)
+    if sys.argv[1] == "to-bin":
+        print(log_to_bin(sys.argv[2], dtype=sys.argv[3] if len(sys.argv) > 3 else "f4"))
+    else:
+        print(bin_to_log(sys.argv[2]))
@@ -0,0 +1,55 @@
+import math
+from array import array
+
+from utils.load_data import parse_metadata
+
+
+"""
+    utils.acq_buffer:
+        Buffer in memoria di un'acquisizione in corso (D1 -> D2... -> D3).
+        Si riempie man mano che i pacchetti vengono decodificati e alla chiusura dello stream
+        viene passato direttamente a FFT e peak detection, senza rileggere il file appena scritto
+        (il file resta solo come persistenza per l'upload).
+
+    Il contenuto coincide con quello che load_sensor restituirebbe dal file:
+        - stessi metadata (fs, asse, sync...)
+        - i valori non finiti (nan, inf) vengono scartati
+        - i campioni non passano dalla formattazione testuale (precisione piena)
+"""
+
+DEFAULT_CAPACITY = 0x4000               # 16k campioni, acquisizione massima (DATAKB_MAP)
+
+
+class AcquisitionBuffer:
+    def __init__(self, metadata, capacity=DEFAULT_CAPACITY):
+        self.metadata = metadata                        # come load_sensor()["metadata"]
+        self._data = array('d', bytes(8 * capacity))    # preallocato
+        self.count = 0
+
+    @classmethod
+    def from_header(cls, header, capacity=DEFAULT_CAPACITY):
+        """
+            Crea il buffer a partire dall'header D1 (ProtocolDecoder.parse_start_header)
+        """
+        metadata = parse_metadata(
+            [header['time'], header['range'], header['odr'], header['axis_file']], header['sync']
+        )
+        return cls(metadata, capacity)
+
+    def extend(self, values):
+        """ Accoda i campioni decodificati di un pacchetto """
+        values = [v for v in values if math.isfinite(v)]
+        end = self.count + len(values)
+
+        if end > len(self._data):                       # acquisizione piu' lunga del previsto
+            grow = max(end - len(self._data), len(self._data))
+            self._data.extend(array('d', bytes(8 * grow)))
+        self._data[self.count:end] = array('d', values)
+        self.count = end
+
+    def samples(self):
+        """ Returns: lista dei campioni ricevuti (stesso formato di load_sensor()["samples"]) """
+        return self._data[:self.count].tolist()
+
+    def __len__(self):
+        return self.count
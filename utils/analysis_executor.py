@@ -0,0 +1,141 @@
+import signal
+import time
+import multiprocessing
+
+
+"""
+    utils.analysis_executor:
+        Esecuzione delle analisi (FFT + picchi) in un piccolo pool di processi, separata dal loop radio.
+        - submit() mette in coda il job e ritorna subito (D3 non aspetta la FFT)
+        - poll() raccoglie i job terminati, da chiamare a ogni giro del loop principale
+        - wait() attende i job di un sensore (prima di leggere i risultati all'A1 successivo),
+          al massimo max_wait secondi
+
+    Al pool vengono affidati al massimo workers job alla volta (gli altri restano in coda qui):
+    un job affidato parte subito su un worker libero, quindi il timeout misura la sua esecuzione
+    e non l'attesa dietro ad altri job (es. una FFT 16k).
+
+    Isolamento dei guasti:
+        - un'eccezione nel job viene restituita come esito negativo del solo job
+        - un job che supera timeout (worker bloccato o terminato in modo anomalo: il pool sostituisce
+          il processo ma il risultato non arriva mai) viene dato per fallito, il pool viene
+          terminato e ricreato; gli altri job in esecuzione tornano in testa alla coda
+
+    Esito di un job: (key, context, ok, value) con value = risultato oppure messaggio d'errore.
+"""
+
+
+def _init_worker():
+    # Ctrl+C gestito solo dal processo del gateway
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class _Job:
+    def __init__(self, key, fn, args, context):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.context = context                  # dati del chiamante restituiti con l'esito
+        self.async_result = None
+        self.deadline = 0
+
+
+class AnalysisExecutor:
+    def __init__(self, workers=1, timeout=60.0):
+        self.workers = workers                  # processi del pool
+        self.timeout = timeout                  # tempo massimo di un job dall'avvio su un worker (s)
+
+        self._pool = None                       # creato al primo submit
+        self._jobs = []                         # job affidati al pool (al massimo workers)
+        self._queue = []                        # job in attesa di un worker, in ordine di sottomissione
+        self.restarts = 0
+
+    def submit(self, key, fn, args=(), context=None):
+        """ Accoda fn(*args) nel pool, key identifica il sensore """
+        self._queue.append(_Job(key, fn, args, context))
+        self._dispatch()
+
+    def pending(self, key=None):
+        """ True se ci sono job in corso o in coda (per key, o in totale se key e' None) """
+        return any(key is None or job.key == key for job in self._jobs + self._queue)
+
+    def poll(self):
+        """ Returns: lista degli esiti dei job terminati o scaduti (non bloccante) """
+        done = []
+        running = []
+        expired = False
+        now = time.monotonic()
+
+        for job in self._jobs:
+            if job.async_result.ready():
+                done.append(self._outcome(job))
+            elif now >= job.deadline:
+                done.append((job.key, job.context, False, "timeout dopo %.0f s" % self.timeout))
+                expired = True
+            else:
+                running.append(job)
+
+        self._jobs = running
+        if expired:
+            self._restart()
+        self._dispatch()
+        return done
+
+    def wait(self, key, max_wait=None):
+        """
+            Attende i job di key, fino alla loro scadenza o al massimo max_wait secondi
+            (None = nessun limite oltre al timeout dei job).
+            Returns: esiti di tutti i job terminati nel frattempo (anche di altri sensori)
+        """
+        done = []
+        limit = None if max_wait is None else time.monotonic() + max_wait
+        while self.pending(key):
+            now = time.monotonic()
+            if limit is not None and now >= limit:
+                break
+            # job di key in esecuzione, altrimenti (ancora in coda) il primo che puo' liberare un worker
+            job = next((job for job in self._jobs if job.key == key), self._jobs[0])
+            remaining = job.deadline - now
+            if limit is not None:
+                remaining = min(remaining, limit - now)
+            if remaining > 0:
+                job.async_result.wait(remaining)
+            done.extend(self.poll())
+        return done + self.poll()
+
+    def shutdown(self):
+        """ Termina il pool (i job in corso e in coda vengono abbandonati) """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._jobs = []
+        self._queue = []
+
+    def _dispatch(self):
+        """ Affida al pool i job in coda finche' ci sono worker liberi """
+        while self._queue and len(self._jobs) < self.workers:
+            job = self._queue.pop(0)
+            self._start(job)
+            self._jobs.append(job)
+
+    def _start(self, job):
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers, initializer=_init_worker)
+        job.async_result = self._pool.apply_async(job.fn, job.args)
+        job.deadline = time.monotonic() + self.timeout
+
+    def _outcome(self, job):
+        try:
+            return (job.key, job.context, True, job.async_result.get(0))
+        except Exception as e:
+            return (job.key, job.context, False, f"{type(e).__name__}: {e}")
+
+    def _restart(self):
+        """ Ricrea il pool: i job interrotti tornano in testa alla coda (ripartono da capo) """
+        self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+        self.restarts += 1
+        self._queue[:0] = self._jobs
+        self._jobs = []
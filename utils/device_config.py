@@ -0,0 +1,56 @@
+import os
+
+from protocol_decoder import ProtocolDecoder
+
+
+"""
+    utils.device_config:
+        Configurazione dei sensori (config.txt) con ricarica solo quando il file cambia.
+        - il file viene riletto solo se cambiano mtime, dimensione o inode (os.stat per frame
+          invece di open + parsing)
+        - per ogni sensore i campi statici del pacchetto 0xA2 vengono precalcolati alla ricarica
+          (ProtocolDecoder.build_config_fields): a ogni sync restano solo timestamp e delay
+
+    Formato config.txt: una riga per sensore, MAC (16 caratteri) + spazio + parametri.
+    Come nella lettura originale i sensori rimossi dal file restano configurati fino al riavvio.
+"""
+
+
+class DeviceConfigManager:
+    def __init__(self, path):
+        self.path = path
+        self.configs = {}                       # addr -> stringa parametri (config_dict del gateway)
+        self._fields = {}                       # addr -> campi statici 0xA2 (None se non calcolabili)
+        self._stamp = None                      # (mtime_ns, size, inode) dell'ultima lettura
+        self.reloads = 0
+
+    def refresh(self):
+        """
+            Rilegge il file se e' cambiato dall'ultima lettura.
+            Returns: True se la configurazione e' stata ricaricata
+        """
+        st = os.stat(self.path)
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if stamp == self._stamp:
+            return False
+
+        with open(self.path, 'r') as c:
+            lines = c.readlines()
+        for line in lines:
+            config_address = line[:16]          # MAC
+            config_parameters = line[17:].strip()   # Parametri (range, ODR, asse, soglie si shock)
+            if self.configs.get(config_address) == config_parameters and config_address in self._fields:
+                continue
+            self.configs[config_address] = config_parameters
+            try:
+                self._fields[config_address] = ProtocolDecoder.build_config_fields(config_parameters)
+            except ValueError:
+                self._fields[config_address] = None     # calcolato (e segnalato) al momento del sync
+
+        self._stamp = stamp
+        self.reloads += 1
+        return True
+
+    def fields(self, addr):
+        """ Campi statici precalcolati del pacchetto 0xA2 (None se assenti o non validi) """
+        return self._fields.get(addr)
@@ -1,16 +1,149 @@
 import json
-import urllib.request
-import urllib.error
+import base64
+import struct
+import http.client
+import threading
+import urllib.parse
 import os
 import re
+import math
+import itertools
 from datetime import datetime
 from math import degrees, atan2, acos
 from utils.load_data import load_sensor
+from utils import acq_binary
+
+
+"""
+    utils.fastapi_manager:
+        - prepara il payload JSON di ogni acquisizione (metadati, metriche, picchi FFT, campioni)
+        - invio con una connessione http.client persistente (keep-alive) per endpoint,
+          riaperta in modo trasparente se il server la chiude tra una richiesta e l'altra
+        - modalita' batch opzionale: piu' file (anche di sensori diversi) in una sola richiesta
+          a batch_url, il server risponde con un esito per ogni elemento:
+              richiesta: {"items": [payload, ...]}
+              risposta:  {"results": [{"status": 200, ...}, ...]}   (stesso ordine di items)
+        - codifica dei campioni concordata via config (samples_encoding):
+              "json": lista di float (default, payload invariato)
+              "f2"/"f4": float16/float32 little-endian in base64, formato dichiarato nel payload
+                  "samples": "<base64>",
+                  "samples_format": {"encoding": "base64", "dtype": "f4", "byteorder": "little",
+                                     "scale": 1.0, "offset": 0.0, "count": n}
+              valore = campione_decodificato * scale + offset
+              "f4" trasmette i campioni invariati (scale 1, offset 0); "f2" trasmette la vibrazione
+              al netto della media (offset) normalizzata sul picco (scale), cosi' la precisione
+              float16 (~3 cifre) e' relativa all'ampiezza di vibrazione e non alla gravita' (~1 g).
+              Campioni non finiti fanno ripiegare su "f4" (dichiarato in samples_format)
+"""
+
+SAMPLES_ENCODINGS = ("json", "f2", "f4")
+
+
+def encode_samples_field(samples, encoding="json"):
+    """
+        Returns: (valore del campo "samples", samples_format oppure None per "json")
+    """
+    if encoding == "json":
+        return samples, None
+    dtype, scale, offset = encoding, 1.0, 0.0
+    try:
+        if dtype == "f2" and samples:
+            offset = math.fsum(samples) / len(samples)
+            scale = max(abs(v - offset) for v in samples) or 1.0
+            if not math.isfinite(scale):
+                raise OverflowError("campioni non finiti")
+            raw = acq_binary.encode_samples([(v - offset) / scale for v in samples], dtype)
+        else:
+            raw = acq_binary.encode_samples(samples, dtype)
+    except (OverflowError, struct.error):
+        dtype, scale, offset = "f4", 1.0, 0.0                  # fuori range float16
+        raw = acq_binary.encode_samples(samples, dtype)
+    fmt = {"encoding": "base64", "dtype": dtype, "byteorder": "little", "scale": scale, "offset": offset,
+           "count": len(samples)}
+    return base64.b64encode(raw).decode('ascii'), fmt
+
+
+def decode_samples_field(payload):
+    """
+        Decoder di riferimento (lato server / test): campioni come lista di float
+        da un payload in qualsiasi codifica
+    """
+    fmt = payload.get("samples_format")
+    if fmt is None:
+        return list(payload["samples"])
+    raw = base64.b64decode(payload["samples"])
+    order = "<" if fmt.get("byteorder", "little") == "little" else ">"
+    code = acq_binary.DTYPES[fmt["dtype"]][1]
+    values = struct.unpack("%s%d%s" % (order, fmt["count"], code), raw)
+    scale = fmt.get("scale", 1.0)
+    offset = fmt.get("offset", 0.0)
+    return [v * scale + offset for v in values]
+
+_RETRY_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                 ConnectionResetError, BrokenPipeError)
 
 
 class FastAPIHandler:
-    def __init__(self, url):
+    def __init__(self, url, batch=False, batch_url=None, batch_max=8, timeout=120, samples_encoding="json"):
+        if samples_encoding not in SAMPLES_ENCODINGS:
+            raise ValueError(f"samples_encoding non valido: {samples_encoding}")
         self.url = url
+        self.samples_encoding = samples_encoding                # "json", "f2", "f4"
+        self.batch = batch                                      # invio multi-file in una richiesta
+        self.batch_url = batch_url or url.rstrip('/') + '/batch'
+        self.batch_max = batch_max                              # elementi massimi per richiesta
+        self.timeout = timeout
+
+        self._connections = {}                                  # (scheme, host, port) -> HTTPConnection
+        self._lock = threading.Lock()
+
+    def _post_json(self, url, payload):
+        """
+            POST JSON sulla connessione persistente dell'endpoint.
+            Returns: (status HTTP, corpo della risposta)
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+
+        with self._lock:
+            # una sola nuova connessione se quella riusata e' stata chiusa dal server
+            for attempt in (1, 2):
+                conn = self._connections.get(key)
+                reused = conn is not None
+                if conn is None:
+                    cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+                    conn = cls(parts.hostname, parts.port, timeout=self.timeout)
+                    self._connections[key] = conn
+                try:
+                    conn.request('POST', path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    data = response.read()                      # lettura completa: connessione riusabile
+                    if response.will_close:
+                        self._close(key)
+                    return response.status, data
+                except _RETRY_ERRORS:
+                    self._close(key)
+                    if not reused or attempt == 2:
+                        raise
+                except Exception:
+                    self._close(key)
+                    raise
+
+    def _close(self, key):
+        conn = self._connections.pop(key, None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        """ Chiude tutte le connessioni persistenti """
+        with self._lock:
+            for key in list(self._connections):
+                self._close(key)
 
     def _prepare_payload(self, addr, filename, local_dir, fft_result):
         path = os.path.join(local_dir, filename)
@@ -46,8 +179,10 @@ class FastAPIHandler:
         freq_peaks = [current_fft.get(f"peak_freq_{i}", 0.0) for i in range(1, 5)]
         mags_peaks = [current_fft.get(f"max_mag_{i}", 0.0) for i in range(1, 5)]
 
+        samples, samples_format = encode_samples_field(samples, self.samples_encoding)
+
         # payload
-        return {
+        payload = {
             "mac": addr,
             "timestamp": ts.isoformat(),
             "asse": axis,
@@ -64,6 +199,9 @@ class FastAPIHandler:
             },
             "samples": samples
         }
+        if samples_format is not None:
+            payload["samples_format"] = samples_format
+        return payload
 
 
 
@@ -72,27 +210,70 @@ class FastAPIHandler:
         if not files_to_send:
             return
 
+        if self.batch:
+            return self.upload_batch({addr: (files_to_send, fft_result)}, local_dir, logger_callback)[addr]
+
         uploaded_successfully = []
         for filemame in list(files_to_send):
             payload = self._prepare_payload(addr, filemame, local_dir, fft_result)
 
             if payload == "FILE NOT FOUND":
                 logger_callback(f"\t[FastAPI][WARN] File {filemame} rimosso\n")
-            if payload:
+            if payload and payload != "FILE NOT FOUND":
                 try:
-                    data_json = json.dumps(payload).encode('utf-8')
-                    req = urllib.request.Request(
-                        url=self.url,
-                        data=data_json,
-                        headers={'Content-Type': 'application/json'},
-                        method='POST'
-                    )
-                    with urllib.request.urlopen(req, timeout=120) as response:
-                        if response.status == 200:
-                            logger_callback(f"\t[FastAPI] OK. {filemame} salvato con MAC {addr}\n")
-                            uploaded_successfully.append(filemame)
+                    status, _ = self._post_json(self.url, payload)
+                    if status == 200:
+                        logger_callback(f"\t[FastAPI] OK. {filemame} salvato con MAC {addr}\n")
+                        uploaded_successfully.append(filemame)
                 except Exception as e:
                     logger_callback(f"\t[FastAPI][ERRORE] {str(e)}")
                     return []
                     
-        return uploaded_successfully
\ No newline at end of file
+        return uploaded_successfully
+
+
+    def _batch_items(self, pending, local_dir, logger_callback):
+        """ Generatore (addr, file, payload) dei file in attesa, payload preparato al momento """
+        for addr, (files, fft_result) in pending.items():
+            for filename in files:
+                payload = self._prepare_payload(addr, filename, local_dir, fft_result)
+                if payload == "FILE NOT FOUND":
+                    logger_callback(f"\t[FastAPI][WARN] File {filename} rimosso\n")
+                elif payload:
+                    yield addr, filename, payload
+
+
+    def upload_batch(self, pending, local_dir, logger_callback):
+        """
+            Params:
+                - pending: dict addr -> (file da inviare, fft_result del sensore)
+            Returns:
+                - dict addr -> file salvati dal server (esito per singolo elemento)
+        """
+        uploaded = {addr: [] for addr in pending}
+        items = self._batch_items(pending, local_dir, logger_callback)
+
+        # payload preparati una richiesta alla volta: dopo un'interruzione lunga la coda puo'
+        # contenere molti file, in memoria restano solo i campioni di batch_max file
+        while True:
+            chunk = list(itertools.islice(items, self.batch_max))
+            if not chunk:
+                break
+            try:
+                status, data = self._post_json(self.batch_url, {"items": [item[2] for item in chunk]})
+                if status != 200:
+                    logger_callback(f"\t[FastAPI][ERRORE] Batch rifiutato: HTTP {status}\n")
+                    break
+                results = json.loads(data.decode('utf-8')).get("results", [])
+            except Exception as e:
+                logger_callback(f"\t[FastAPI][ERRORE] {str(e)}")
+                break
+
+            for (addr, filename, _), result in zip(chunk, results):
+                if isinstance(result, dict) and result.get("status") == 200:
+                    logger_callback(f"\t[FastAPI] OK. {filename} salvato con MAC {addr}\n")
+                    uploaded[addr].append(filename)
+                else:
+                    logger_callback(f"\t[FastAPI][ERRORE] {filename}: {result}\n")
+
+        return uploaded
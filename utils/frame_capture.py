@@ -0,0 +1,83 @@
+import struct
+import threading
+import time
+
+
+"""
+    utils.frame_capture:
+        Registrazione dei frame radio ricevuti dal gateway, per riprodurre una sessione di campo
+        fuori dal dispositivo (protocol_replay.ReplayXBeeManager).
+
+    Formato binario (big endian):
+        header  b"GWCAP" + versione (1 byte)
+        record  timestamp (float64, epoch s) | MAC (uint64) | lunghezza (uint16) | payload
+    18 byte per frame oltre al payload; un record troncato (spegnimento durante la scrittura)
+    viene ignorato in lettura.
+    Il file e' limitato a max_mb: raggiunto il limite la registrazione si ferma (la cattura resta
+    una sessione continua dall'avvio, riproducibile) e write restituisce False.
+"""
+
+MAGIC = b"GWCAP"
+VERSION = 1
+_HEADER = MAGIC + bytes([VERSION])
+_RECORD = struct.Struct(">dQH")
+
+
+class CaptureWriter:
+    def __init__(self, path, flush_every=64, max_mb=64):
+        self.path = path
+        self.flush_every = flush_every          # frame tra due flush su disco
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.frames = 0
+        self._lock = threading.Lock()           # write dal thread di lettura radio, close dal gateway
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(_HEADER)
+        self._size = self._file.tell()
+
+    def write(self, addr, payload_bytes, timestamp=None):
+        """
+            Registra un frame (timestamp default: ora corrente).
+            Returns: False se la cattura e' chiusa o ha raggiunto max_mb (frame non registrato)
+        """
+        record = _RECORD.pack(time.time() if timestamp is None else timestamp,
+                              int(addr, 16), len(payload_bytes)) + bytes(payload_bytes)
+        with self._lock:
+            if self._file is None:
+                return False
+            if self._size + len(record) > self.max_bytes:
+                self._file.close()
+                self._file = None
+                return False
+            self._file.write(record)
+            self._size += len(record)
+            self.frames += 1
+            if self.frames % self.flush_every == 0:
+                self._file.flush()
+            return True
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_capture(path):
+    """ Generatore dei frame registrati: (timestamp, MAC, payload_bytes) """
+    with open(path, "rb") as f:
+        header = f.read(len(_HEADER))
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: non e' un file di cattura")
+        if header[len(MAGIC):] != bytes([VERSION]):
+            raise ValueError(f"{path}: versione non supportata")
+
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                return
+            timestamp, mac, length = _RECORD.unpack(head)
+            payload_bytes = f.read(length)
+            if len(payload_bytes) < length:
+                return
+            yield timestamp, f"{mac:016x}", payload_bytes
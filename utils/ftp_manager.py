@@ -1,66 +1,160 @@
 import ftplib
+import io
 import os
+import threading
+import time
+
+from utils import acq_binary
 
 
 """
-    utils.ftp_manager: 
+    utils.ftp_manager:
         - gestisce la connessione FTP e l'upload dei file al server
         - rimuove i file dalla memoria del gateway dopo l'upload
+        - i file binari (.bin) vengono convertiti al volo in .log, il server riceve il formato testuale
+          (un .bin con header illeggibile viene inviato cosi' com'e', per non restare in coda per sempre)
+        - una sola sessione persistente condivisa da tutti i sensori (connect/login/cwd una volta sola):
+            - tenuta viva con NOOP ogni keepalive secondi da un thread dedicato
+            - chiusa dopo idle_timeout secondi senza upload
+            - riconnessione trasparente se la sessione cade durante un invio
+            - accesso serializzato da un lock (upload dal worker e keepalive non si sovrappongono)
 """
 
+# errori di connessione per cui ha senso riaprire la sessione (non i rifiuti del server, error_perm)
+_CONNECTION_ERRORS = (OSError, EOFError, ftplib.error_temp, ftplib.error_reply, ftplib.error_proto)
+
 
 class FTPClient:
-    def __init__(self, server, user, pwd, path, local_dir):
+    def __init__(self, server, user, pwd, path, local_dir, keepalive=60, idle_timeout=300):
         self.server = server                    #ftp.wisepower.it
         self.user = user                        #REDACTED
-        self.pwd = pwd                          #password 
+        self.pwd = pwd                          #password
         self.path = path                        #www.wisepower.it/SHM_Files/Test_Ufficio
         self.local_dir = local_dir              #/etc/config/scripts/SHM_Data/
-        
+        self.keepalive = keepalive              #intervallo NOOP (s), 0 = nessun keepalive
+        self.idle_timeout = idle_timeout        #chiusura sessione dopo inattivita' (s)
+
+        self._session = None
+        self._last_used = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if keepalive > 0:
+            threading.Thread(target=self._keepalive_loop, name="ftp-keepalive", daemon=True).start()
+
     """
         Spedisce la lista dei file per un determinato sensore al server FTP.
 
-        Params: 
+        Params:
             - addr: MAC
             - files_to_send: lista dei file da spedire (un sensore per chiamata)
         Returns:
             - status: stringa errore o vuota se ok
     """
-    
+
     def upload_files(self, addr, files_to_send, logger_callback):
         # Spedisce la lista di file al server e pulisce la cartella locale
-        
+
         uploaded_successfully = []
-        logger_callback(f"\t[FTP] Tentativo di connessione a {self.server}...\n")
         if not files_to_send:
             return ""
 
-        status = ""
-        try:
-            # Apro la sessione e mi connetto
-            session = ftplib.FTP()
-            session.connect(self.server, 21, 60.0)
-            session.login(self.user, self.pwd)
-            session.cwd(self.path)
-
+        with self._lock:
             # Ciclo di invio sui file
             for filename in list(files_to_send):
-                full_local_path = os.path.join(self.local_dir, filename)
-
                 try:
-                    with open(full_local_path, 'rb') as f:
-                        session.storbinary(f'STOR {filename}', f)
-                    
-                    uploaded_successfully.append(filename)
-                    logger_callback(f"\t[FTP] File {filename} trasferito con successo\n")
+                    remote_name, data = self._read_local(filename, logger_callback)
                 except Exception as e:
+                    # solo questo file resta in coda, gli altri vengono inviati
                     logger_callback(f"[FTP] Errore su {filename}: {str(e)}\n")
-                    return []
-
-            session.close()
-        except Exception as e:
-            status = str(e)
-            logger_callback(f"\t[FTP] Errore durante l'upload per {addr}: {status}")
-            return []
-        
-        return uploaded_successfully
\ No newline at end of file
+                    continue
+
+                # una riconnessione per file solo se la sessione era gia' aperta (scaduta lato server)
+                while True:
+                    self._expire_idle()
+                    reused = self._session is not None
+                    try:
+                        session = self._get_session(logger_callback)
+                        session.storbinary(f'STOR {remote_name}', io.BytesIO(data))
+                        self._last_used = time.monotonic()
+                        break
+                    except _CONNECTION_ERRORS as e:
+                        self._drop_session()
+                        if not reused:
+                            logger_callback(f"\t[FTP] Errore durante l'upload per {addr}: {str(e)}")
+                            return []
+                        logger_callback(f"\t[FTP] Sessione persa ({str(e)}), riconnessione\n")
+                    except Exception as e:
+                        logger_callback(f"[FTP] Errore su {filename}: {str(e)}\n")
+                        return []
+
+                uploaded_successfully.append(filename)
+                logger_callback(f"\t[FTP] File {filename} trasferito con successo\n")
+
+        return uploaded_successfully
+
+    def close(self):
+        """ Ferma il keepalive e chiude la sessione (QUIT) """
+        self._stop.set()
+        with self._lock:
+            if self._session is not None:
+                try:
+                    self._session.quit()
+                except Exception:
+                    pass
+                self._drop_session()
+
+    def _read_local(self, filename, logger_callback):
+        """ Returns: (nome remoto, contenuto) del file locale """
+        full_local_path = os.path.join(self.local_dir, filename)
+        if filename.endswith(acq_binary.BIN_EXT):
+            text = acq_binary.bin_to_log_text(full_local_path)
+            if text is not None:
+                return filename[:-len(acq_binary.BIN_EXT)] + '.log', text.encode('utf-8')
+            logger_callback(f"\t[FTP][WARN] Header di {filename} non valido: inviato il .bin senza conversione\n")
+        with open(full_local_path, 'rb') as f:
+            return filename, f.read()
+
+    def _get_session(self, logger_callback):
+        """ Sessione corrente (chiamata con il lock), aperta se assente """
+        if self._session is None:
+            # Apro la sessione e mi connetto
+            logger_callback(f"\t[FTP] Tentativo di connessione a {self.server}...\n")
+            session = ftplib.FTP()
+            try:
+                session.connect(self.server, 21, 60.0)
+                session.login(self.user, self.pwd)
+                session.cwd(self.path)
+            except Exception:
+                session.close()
+                raise
+            self._session = session
+            self._last_used = time.monotonic()
+        return self._session
+
+    def _expire_idle(self):
+        """ Chiude la sessione inattiva da piu' di idle_timeout (chiamata con il lock) """
+        if self._session is not None and time.monotonic() - self._last_used >= self.idle_timeout:
+            try:
+                self._session.quit()
+            except Exception:
+                pass
+            self._drop_session()
+
+    def _drop_session(self):
+        if self._session is not None:
+            try:
+                self._session.close()
+            except Exception:
+                pass
+        self._session = None
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive):
+            with self._lock:
+                self._expire_idle()
+                if self._session is None:
+                    continue
+                try:
+                    self._session.voidcmd("NOOP")
+                except ftplib.all_errors:
+                    self._drop_session()                # riaperta al prossimo upload
@@ -1,4 +1,4 @@
-import statistics
+from utils.spectral_features import compute_features
 
 """
     utils.get_peak_prominence
@@ -13,9 +13,11 @@ import statistics
     ---------
     calculate_prominence(magnitudes, peak_idx):
         calcola la prominence di un picco, prendendo la valle piu superficiale
+    calculate_prominences(magnitudes):
+        calcola in tempo lineare (stack monotono) prominence e valli di tutti i massimi locali
     def calculate_half_power_width_prominenceBased(magnitudes, prominence, peak_idx, fs, n):
         calcola la larghezza di banda a meta potenza, adattando il magnitudo target in base alla prominence
-    def get_top_peaks_prominence(res_fft, fs, k=4):
+    def get_top_peaks_prominence(res_fft, fs, k=4, features=None):
         funzione principale chiamata dal gateway. Esegue un ciclo per trovare i k picchi piu alti.
         restituisce una lista di dizionari con frequenza, magnitudo, prominence, smorzamento e q-factor del picco
 
@@ -53,6 +55,45 @@ def calculate_prominence(magnitudes, peak_idx):
     # La prominence è la distanza tra la vetta e la valle più alta
     return peak_mag - max(min_left, min_right)
 
+"""
+    Params:
+        - magnitudes: lista di magnitudo (modulo FFT)
+    Returns:
+        - dict {idx: (prominence, left_base, right_base)} per ogni massimo locale
+          (magnitudes[j] > magnitudes[j-1] e magnitudes[j] > magnitudes[j+1]);
+          left_base/right_base sono gli indici delle valli (minimo prima di un picco piu' alto)
+    Note:
+        - stesso risultato di calculate_prominence, ma in O(n) per tutti i candidati:
+          una passata per lato con uno stack monotono, ogni elemento dello stack conserva
+          il minimo del tratto che copre fino all'elemento precedente.
+"""
+def calculate_prominences(magnitudes):
+    n = len(magnitudes)
+
+    def side_minima(indices):
+        # per ogni indice: (minimo, indice del minimo) tra il picco e il primo valore piu' alto
+        minima = [None] * n
+        stack = []                                      # [idx, valore, min_tratto, idx_min_tratto]
+        for i in indices:
+            val = magnitudes[i]
+            min_val, min_idx = val, i
+            while stack and stack[-1][1] <= val:
+                _, _, seg_val, seg_idx = stack.pop()
+                if seg_val < min_val:                   # a parita' resta la valle piu' vicina
+                    min_val, min_idx = seg_val, seg_idx
+            minima[i] = (min_val, min_idx)
+            stack.append((i, val, min_val, min_idx))
+        return minima
+
+    left = side_minima(range(n))
+    right = side_minima(range(n - 1, -1, -1))
+
+    prominences = {}
+    for j in range(1, n - 1):
+        if magnitudes[j] > magnitudes[j-1] and magnitudes[j] > magnitudes[j+1]:
+            prominences[j] = (magnitudes[j] - max(left[j][0], right[j][0]), left[j][1], right[j][1])
+    return prominences
+
 # def calculate_half_power_width(magnitudes, peak_idx, fs, n):
 #     # Punto a -3dB dal picco
 #     target_mag = 0.707 * magnitudes[peak_idx]
@@ -142,12 +183,15 @@ def calculate_half_power_width_prominenceBased(magnitudes, prominence, peak_idx,
         - res_fft: raw FFT (array di numeri complessi)
         - fs: ''
         - k: numero di picchi da resituire (default 4)
+        - features: output di utils.spectral_features.compute_features (opzionale)
     Returns:
         - final_peaks: lista di dict con frequenza, magnitudo, prominence, smorzamento
             e q-factor dei picchi
 """
-def get_top_peaks_prominence(res_fft, fs, k=4):
-    n = len(res_fft)
+def get_top_peaks_prominence(res_fft, fs, k=4, features=None):
+    if features is None:
+        features = compute_features(res_fft, fs)
+    n = features["n"]
     half_len = n // 2
     
     # Range di smorzamento accettabile
@@ -156,22 +200,24 @@ def get_top_peaks_prominence(res_fft, fs, k=4):
     MIN_DAMPING = 0.001
     MAX_DAMPING = 0.07
 
-    magnitudes = [abs(res_fft[i]) for i in range(half_len)]
-    frequencies = [i * (fs/n) for i in range(half_len)]
+    magnitudes = features["magnitudes"]
+    frequencies = features["frequencies"]
 
     # Soglia dinamica per rumore di fondo
-    avg = statistics.mean(magnitudes)
-    std = statistics.stdev(magnitudes)
-    threshold = avg + 2 * std
+    std = features["std"]
+    threshold = features["threshold"]
     
     candidates = []
+
+    # prominence di tutti i massimi locali in un'unica passata
+    prominences = calculate_prominences(magnitudes)
     
     # Cerco massimi locali sopra la soglia
     for j in range(1, half_len-1):
         if magnitudes[j] > magnitudes[j-1] and magnitudes[j] > magnitudes[j+1]:
             if magnitudes[j] > threshold:
                 
-                prominence = calculate_prominence(magnitudes, j)
+                prominence = prominences[j][0]
                 
                 # se il picco spunta abbastanza
                 if prominence > (0.5 * std):
@@ -1,4 +1,7 @@
-import statistics
+import heapq
+from bisect import bisect_right
+
+from utils.spectral_features import compute_features
 
 """
 utils.get_peak_resolution
@@ -12,7 +15,7 @@ width_half_magnitude(magnitudes, peak_idx)
 resolution(magnitudes, idx1, idx2)
     Applica la formula di risoluzione, se il valore ottenuto e' inferiore a 1.5 i picchi
     sono considerati troppo vicini per essere riconoscibili (ne scarto uno)
-get_top_peaks_resolution(fft_res, fs, k=5)
+get_top_peaks_resolution(fft_res, fs, k=5, features=None)
     Funzione principale chiamata dal gateway. Esegue un ciclo per trovare ik picchi piu' alti,
     assicurandosi che ognuno sia separato dagli altri secondo il criterio di risoluzione.
     Restituisce una lista di dizionari con frequenza, magnitudo e indice del picco
@@ -63,66 +66,121 @@ def resolution(magnitudes, idx1, idx2):
     
 
 
+class _ExclusionZones:
+    """
+        Intervalli [start, end) esclusi dalla ricerca (equivalenti ai magnitudi azzerati
+        della versione iterativa), mantenuti ordinati e fusi.
+    """
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def contains(self, idx):
+        pos = bisect_right(self.starts, idx) - 1
+        return pos >= 0 and idx < self.ends[pos]
+
+    def add(self, start, end):
+        pos = bisect_right(self.starts, start)
+        # fusione con gli intervalli sovrapposti o adiacenti
+        if pos > 0 and self.ends[pos - 1] >= start:
+            pos -= 1
+            start = self.starts[pos]
+            end = max(end, self.ends[pos])
+        stop = pos
+        while stop < len(self.starts) and self.starts[stop] <= end:
+            end = max(end, self.ends[stop])
+            stop += 1
+        self.starts[pos:stop] = [start]
+        self.ends[pos:stop] = [end]
+
+
 """
     Parameters
         - fft_res: risultato grezzo della FFT (array numeri complessi), vengono considerate solo
         le frequenze positive, usata per estrarre il magnitudo
         - fs: frequenza di campionamento (in Hz)
         - k: numero massimo di picchi da restituire (default 5)
+        - features: grandezze gia' calcolate con utils.spectral_features.compute_features
+        (opzionale, altrimenti calcolate qui)
     Behavior
         - Calcolo magnitudo e threshold dinamico per esclusione del rumore di fondo
-        - Ricerca iterativa del picco piu alto, calcolo della larghezza a meta potenza (widh_half_magnitude())
-            applicazione del criterio di risoluzione (resolution()) e confronto con quelli gia salvati
+        - Estrazione in un'unica passata dei massimi locali sopra soglia, ordinati con un heap
+            (a parita' di magnitudo vince l'indice minore)
         - Un candidato viene accettato solo se il suo valore di risoluzione rispetto a tutti i picchi gia'
             salvati e' >= 1.5 (altrimenti e' troppo vicino a un picco gia' considerato)
-        - Dopo aver accettato un picco, si azzerano i magnitudi nei dintorni di quel picco
+        - Dopo ogni candidato si esclude un intorno del 2% (intervallo, senza scrivere zeri nei magnitudi):
+            i bin esclusi valgono 0 per la larghezza a meta' potenza e i bin subito fuori
+            dall'intervallo possono diventare nuovi massimi locali (come nella versione iterativa)
+        - La larghezza a meta' potenza di ogni picco viene calcolata una sola volta e messa in cache
 """
-def get_top_peaks_resolution(fft_res, fs, k=5):
-    n = len(fft_res)
+def get_top_peaks_resolution(fft_res, fs, k=5, features=None):
+    # magnitudi, frequenze e soglia minima per non prendere il rumore di fondo
+    if features is None:
+        features = compute_features(fft_res, fs)
+    n = features["n"]
     half_len = n // 2
     
-    magnitudes = [abs(fft_res[i]) for i in range(half_len)]
-    frequencies = [i * (fs / n) for i in range(half_len)]
-    
-    # Soglia minima per non prendere il rumore di fondo
-    avg = statistics.mean(magnitudes)
-    std = statistics.stdev(magnitudes)
-    threshold = avg + 2 * std
-    
+    magnitudes = features["magnitudes"]
+    frequencies = features["frequencies"]
+    threshold = features["threshold"]
+
+    zones = _ExclusionZones()
+
+    def value(i):
+        return 0 if zones.contains(i) else magnitudes[i]
+
+    def is_candidate(j):
+        return (1 <= j < half_len - 1 and not zones.contains(j) and magnitudes[j] > threshold
+                and magnitudes[j] > value(j-1) and magnitudes[j] > value(j+1))
+
+    def width(idx):
+        # width_half_magnitude sui magnitudi con le zone escluse a 0
+        half_max = 0.707 * value(idx)
+        left = idx
+        while left > 0 and value(left) > half_max:
+            left -= 1
+        right = idx
+        while right < half_len and value(right) > half_max:
+            right += 1
+        return right - left
+
+    # Massimi locali sopra soglia, estratti una volta sola
+    heap = [(-magnitudes[j], j) for j in range(1, half_len - 1) if is_candidate(j)]
+    heapq.heapify(heap)
+
     peaks = []
+    widths = {}                                         # cache larghezze dei picchi accettati
     
-    while len(peaks) < k:
-        max_val = -1
-        max_idx = -1
-        
-        # Ricerca del picco piu' alto iterativo
-        for j in range(1, half_len - 1):
-            if magnitudes[j] > magnitudes[j-1] and magnitudes[j] > magnitudes[j+1]:
-                if magnitudes[j] > max_val and magnitudes[j] > threshold:
-                    max_val = magnitudes[j]
-                    max_idx = j
+    while len(peaks) < k and heap:
+        max_val, max_idx = heapq.heappop(heap)
+        if zones.contains(max_idx):
+            continue
+        max_val = -max_val
 
         freq = max_idx * (fs/n)
         
-        if max_idx != -1:
-            # Controllo se il nuovo picco è abbastanza lontano da quelli già salvati
-            is_separated = all(resolution(magnitudes, p["idx"], max_idx) >= 1.5
-                            for p in peaks)
-            
-            if is_separated:
-                peaks.append({"freq": freq, "mag": max_val, "idx": max_idx})
-            
-            # Azzero la zona intorno al picco trovato per cercare il prossimo
-            distance = frequencies[2] - frequencies[1]
-            campioni_da_scartare = round((freq * 0.02) / distance) # Intorno del 2%
-            
-            start = max(0, max_idx - campioni_da_scartare)
-            end = min(half_len, max_idx + campioni_da_scartare + 1)
-            
-            for j in range(start, end):
-                magnitudes[j] = 0
-        else:
-            # Non ci sono più picchi sopra la soglia
-            break
+        # Controllo se il nuovo picco è abbastanza lontano da quelli già salvati
+        w2 = width(max_idx)
+        is_separated = all((widths[p["idx"]] + w2) != 0 and
+                           1.18 * abs(max_idx - p["idx"]) / (widths[p["idx"]] + w2) >= 1.5
+                           for p in peaks)
+        
+        # Escludo la zona intorno al picco trovato per cercare il prossimo
+        distance = frequencies[2] - frequencies[1]
+        campioni_da_scartare = round((freq * 0.02) / distance) # Intorno del 2%
+        
+        start = max(0, max_idx - campioni_da_scartare)
+        end = min(half_len, max_idx + campioni_da_scartare + 1)
+        zones.add(start, end)
+
+        if is_separated:
+            peaks.append({"freq": freq, "mag": max_val, "idx": max_idx})
+            # larghezza vista dai confronti successivi: il picco e' ormai escluso (come se azzerato)
+            widths[max_idx] = width(max_idx)
+
+        # i bin subito fuori dalla zona esclusa possono diventare massimi locali
+        for j in (start - 1, end):
+            if is_candidate(j):
+                heapq.heappush(heap, (-magnitudes[j], j))
     
-    return peaks
\ No newline at end of file
+    return peaks
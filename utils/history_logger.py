@@ -0,0 +1,116 @@
+import os
+import threading
+from datetime import datetime
+
+
+"""
+    utils.history_logger:
+        Logger bufferizzato per history.log, usato da Gateway.append_history.
+        - file tenuto aperto in append, nessun exists/getsize/open per ogni messaggio
+        - i messaggi si accumulano in memoria e vengono scritti su disco da un thread in background
+          al superamento di flush_bytes oppure ogni flush_interval secondi
+        - la dimensione del file e' tenuta in memoria: oltre max_kb il file viene rinominato in .old
+          (sostituendo il precedente) e riaperto con la riga "--- LOG ROTATION ---", come prima;
+          se la rotazione fallisce il file originale viene riaperto e l'errore scritto nel log
+        - close() scarica il buffer e chiude il file (chiamato nel finally di Gateway.run)
+"""
+
+
+class HistoryLogger:
+    def __init__(self, path, max_kb=1024, flush_bytes=8192, flush_interval=1.0):
+        self.path = path
+        self.max_bytes = max_kb * 1024
+        self.flush_bytes = flush_bytes          # soglia di flush per dimensione del buffer
+        self.flush_interval = flush_interval    # soglia di flush per tempo (s), 0 = scrittura immediata
+
+        self._buffer = []
+        self._buffered = 0
+        self._lock = threading.Lock()           # buffer (write da piu' thread)
+        self._io_lock = threading.Lock()        # file e rotazione
+        self._file = None
+        self._size = 0
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._loop, name="history-logger", daemon=True)
+            self._thread.start()
+
+    def write(self, text):
+        """ Accoda il messaggio (nessun I/O nel thread chiamante, salvo flush_interval = 0) """
+        with self._lock:
+            self._buffer.append(text)
+            self._buffered += len(text)
+            full = self._buffered >= self.flush_bytes
+        if self._thread is None:
+            self.flush()
+        elif full:
+            self._wake.set()
+
+    def flush(self):
+        """ Scrive su disco i messaggi in buffer """
+        with self._lock:
+            if not self._buffer:
+                return
+            data = "".join(self._buffer).encode("utf-8")
+            self._buffer = []
+            self._buffered = 0
+
+        with self._io_lock:
+            try:
+                if self._file is None:
+                    self._open()
+                if self._size > self.max_bytes:
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+                self._size += len(data)
+            except Exception as e:
+                print(f"[CRICAL] Log Error: {str(e)}")
+
+    def close(self):
+        """ Ferma il thread, scarica il buffer e chiude il file """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+        self.flush()
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._size = os.fstat(self._file.fileno()).st_size
+
+    def _rotate(self):
+        # LOG ROTATION
+        self._file.close()
+        self._file = None                       # riaperto al prossimo flush se _open fallisce
+        old_log = self.path + ".old"
+        error = None
+        try:
+            if os.path.exists(old_log):
+                os.remove(old_log)
+            os.rename(self.path, old_log)
+        except OSError as e:
+            error = e
+        finally:
+            self._open()                        # file nuovo, oppure l'originale se la rotazione fallisce
+        if error is None:
+            header = f"--- LOG ROTATION: {datetime.now()} ---\n"
+        else:
+            print(f"[CRICAL] Log rotation error: {str(error)}")
+            header = f"--- LOG ROTATION FAILED: {datetime.now()}, {str(error)} ---\n"
+            self._size = 0                      # nuovo tentativo dopo altri max_kb, non a ogni flush
+        header = header.encode("utf-8")
+        self._file.write(header)
+        self._size += len(header)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
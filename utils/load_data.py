@@ -26,8 +26,27 @@ import math
                 }
 """
 
-def load_sensor(filepath):
+def parse_metadata(header, sync_raw):
+    """
+        Costruisce il dict metadata a partire dai campi grezzi dell'header
+        (time, range, odr, asse) e dalla stringa di sync.
+        Condiviso tra il parser testuale e quello binario (utils.acq_binary).
+    """
     metadata = {}
+    metadata["timestamp"] = header[0]
+    metadata["sensitivity"] = header[1].replace(" ", "")
+    metadata["fs"] = float(header[2].replace(" Hz", ""))
+    metadata["axis"] = header[3].replace(" axis", "").replace(" ", "_")
+    metadata["sync_type"] = sync_raw
+    metadata["is_synced"] = 1.0 if sync_raw in ["Synced", "Synced2"] else 0.0
+    return metadata
+
+def load_sensor(filepath):
+    # file binari (vedi utils.acq_binary): stesso dict in uscita, senza parsing testuale
+    if filepath.endswith(".bin"):
+        from utils.acq_binary import load_sensor_bin
+        return load_sensor_bin(filepath)
+
     summary = {}
     samples = []
 
@@ -37,17 +56,10 @@ def load_sensor(filepath):
     if len(lines) < 5:                  #verifica integrita' file
         return None
     
-    # RIGA 0: HEADER
+    # RIGA 0: HEADER / RIGA 1: SYNC
     header = lines[0].strip().split(";")
-    metadata["timestamp"] = header[0]
-    metadata["sensitivity"] = header[1].replace(" ", "")
-    metadata["fs"] = float(header[2].replace(" Hz", ""))
-    metadata["axis"] = header[3].replace(" axis", "").replace(" ", "_")
-
-    # RIGA1: SYNC
     sync_raw = lines[1].strip().replace(";","")
-    metadata["sync_type"] = sync_raw 
-    metadata["is_synced"] = 1.0 if sync_raw in ["Synced", "Synced2"] else 0.0
+    metadata = parse_metadata(header, sync_raw)
     
     # RIGA2 2: SUMMARY
     summary_line = lines[2].strip().split(";")
@@ -0,0 +1,184 @@
+import math
+
+from metrics.fft_iterativa import remove_dc_component, resolve_backend, np
+
+"""
+    utils.peak_refine
+    Raffinamento dei picchi trovati da get_top_peaks_prominence / get_top_peaks_resolution.
+
+    Per ogni picco lo spettro viene rivalutato su una griglia fitta in una banda stretta intorno
+    alla frequenza grezza (DTFT sui punti della griglia: prodotto matrice-vettore con numpy,
+    banco di filtri di Goertzel in puro Python come fallback):
+    si ottiene una stima sub-bin di frequenza e smorzamento senza una FFT piu' lunga
+    (e quindi senza un'acquisizione piu' lunga).
+    Due passate per picco: la prima su +-span_bins bin (raddoppiata fino a MAX_WIDEN volte se i punti
+    a -3dB ne restano fuori) individua massimo e larghezza a -3dB, la seconda ha la griglia
+    proporzionata a quella larghezza (passo ~1/5 della banda a -3dB), per stimare frequenza e
+    smorzamento con una risoluzione legata al picco e non al bin.
+
+    Functions
+    ---------
+    goertzel_mag(samples, freq, fs):
+        modulo della DTFT dei campioni alla frequenza freq (anche non multipla di fs/n)
+    zoom_band(samples, fs, f_start, f_stop, points, backend="auto"):
+        frequenze e moduli su una griglia uniforme tra f_start e f_stop
+    refine_peaks(samples, fs, n_fft, peaks, span_bins=2, points=9, backend="auto"):
+        restituisce per ogni picco frequenza, magnitudo e smorzamento raffinati
+
+    Note
+    -----
+    -   I moduli sono sulla stessa scala della FFT (campioni centrati sulla mediana, padding
+        a zero ininfluente sulla DTFT), quindi confrontabili con "mag" dei picchi grezzi.
+    -   Lo smorzamento e' stimato con la larghezza di banda a meta' potenza (0.707 del picco),
+        se i punti a -3dB non cadono nella banda valutata viene restituito None.
+    -   Un picco largo non piu' di un bin dell'acquisizione (fs / numero di campioni) ha la larghezza
+        del lobo principale della finestra rettangolare (~0.89 bin anche per una sinusoide pura):
+        lo smorzamento non e' misurabile e viene restituito None.
+"""
+
+
+MAX_WIDEN = 16                          # allargamento massimo della banda della prima passata
+
+
+def goertzel_mag(samples, freq, fs):
+    """ Modulo della DTFT alla frequenza freq con l'algoritmo di Goertzel """
+    w = 2.0 * math.pi * freq / fs
+    coeff = 2.0 * math.cos(w)
+    s1 = s2 = 0.0
+    for x in samples:
+        s1, s2 = x + coeff * s1 - s2, s1
+    power = s1 * s1 + s2 * s2 - coeff * s1 * s2
+    return math.sqrt(max(power, 0.0))
+
+
+def zoom_band(samples, fs, f_start, f_stop, points, backend="auto"):
+    """
+        Valuta il modulo dello spettro su points frequenze uniformi in [f_start, f_stop]
+        (backend come start_fft: numpy = prodotto matriciale, python = Goertzel)
+        Returns: (freqs, mags)
+    """
+    step = (f_stop - f_start) / (points - 1) if points > 1 else 0.0
+    freqs = [f_start + i * step for i in range(points)]
+    if resolve_backend(backend) == "numpy":
+        return freqs, _dtft_numpy(samples, freqs, fs)
+    return freqs, [goertzel_mag(samples, f, fs) for f in freqs]
+
+
+def _dtft_numpy(samples, freqs, fs):
+    """
+        Modulo della DTFT su piu' frequenze con numpy, senza la matrice completa dei fasori:
+        con t = a*B + b (B ~ sqrt(n)) e^(-jwt) = e^(-jwaB) * e^(-jwb), quindi
+            X(w) = sum_a e^(-jwaB) * sum_b x[aB + b] e^(-jwb)
+        = un prodotto (n/B x B) @ (B x punti) e una somma pesata: esponenziali solo su ~2*sqrt(n)
+        valori per frequenza invece di n
+    """
+    x = np.asarray(samples, dtype=float)
+    block = max(1, math.isqrt(len(x)))
+    rows = -(-len(x) // block)
+    x = np.concatenate((x, np.zeros(rows * block - len(x)))).reshape(rows, block)  # zeri: DTFT invariata
+    w = np.asarray(freqs) * (-2.0 * math.pi / fs)
+    inner = x @ np.exp(1j * np.outer(np.arange(block), w))                          # (rows, punti)
+    outer = np.exp(1j * np.outer(np.arange(rows) * block, w))
+    return np.abs((inner * outer).sum(axis=0)).tolist()
+
+
+def _parabolic(freqs, mags, i):
+    """ Interpolazione parabolica del massimo sui tre punti intorno a i """
+    if i == 0 or i == len(mags) - 1:
+        return freqs[i], mags[i]
+    a, b, c = mags[i - 1], mags[i], mags[i + 1]
+    denom = a - 2 * b + c
+    if denom == 0:
+        return freqs[i], b
+    p = 0.5 * (a - c) / denom                           # spostamento in passi di griglia (-0.5..0.5)
+    step = freqs[1] - freqs[0]
+    return freqs[i] + p * step, b - 0.25 * (a - c) * p
+
+
+def _crossing(freqs, mags, i, j, target):
+    """ Frequenza (interpolata linearmente) in cui il modulo attraversa target tra i e j """
+    if mags[i] == mags[j]:
+        return freqs[i]
+    t = (target - mags[i]) / (mags[j] - mags[i])
+    return freqs[i] + t * (freqs[j] - freqs[i])
+
+
+def _half_power(freqs, mags, f0, radius):
+    """
+        Massimo (interpolato) entro radius da f0 e punti a -3dB sulla griglia.
+        Returns: (f_ref, mag_ref, f1, f2) con f1/f2 None se non cadono nella banda
+    """
+    near = [i for i, f in enumerate(freqs) if abs(f - f0) <= radius]
+    if not near:                                        # griglia piu' larga di radius: punto piu' vicino
+        near = [min(range(len(freqs)), key=lambda i: abs(freqs[i] - f0))]
+    i_max = max(near, key=mags.__getitem__)
+    f_ref, mag_ref = _parabolic(freqs, mags, i_max)
+
+    target = 0.707 * mag_ref
+    left = i_max
+    while left > 0 and mags[left] > target:
+        left -= 1
+    right = i_max
+    while right < len(mags) - 1 and mags[right] > target:
+        right += 1
+    if mags[left] > target or mags[right] > target:
+        return f_ref, mag_ref, None, None
+    return (f_ref, mag_ref, _crossing(freqs, mags, left, left + 1, target),
+            _crossing(freqs, mags, right - 1, right, target))
+
+
+def refine_peaks(samples, fs, n_fft, peaks, span_bins=2, points=9, backend="auto"):
+    """
+        Params:
+            - samples: campioni dell'acquisizione (non centrati, come passati a start_fft)
+            - fs: frequenza di campionamento
+            - n_fft: numero di bin della FFT grezza (per la larghezza del bin)
+            - peaks: lista di dict con "freq" (output di get_top_peaks_*)
+            - span_bins: semi-ampiezza della banda valutata, in bin della FFT grezza
+            - points: punti della griglia nella banda (per ognuna delle due passate)
+            - backend: "auto", "numpy", "python" (come start_fft)
+        Returns:
+            - lista di dict {"freq", "mag", "damping"} nello stesso ordine dei picchi
+              (damping in %, None se la banda non contiene i punti a -3dB o se la larghezza
+              a -3dB non supera il lobo principale della finestra)
+    """
+    if not peaks or not samples:
+        return []
+
+    if resolve_backend(backend) == "numpy":
+        centered = np.asarray(samples, dtype=float)         # convertiti una volta per tutte le bande
+        centered = centered - np.median(centered)           # come remove_dc_component
+    else:
+        centered = remove_dc_component(list(samples))
+    df = fs / n_fft
+    lobe = fs / len(centered)                           # risoluzione dell'acquisizione (senza padding)
+    refined = []
+
+    for peak in peaks:
+        # 1. banda di +-span_bins bin intorno al picco grezzo, allargata finche' contiene i punti a -3dB
+        #    (il massimo resta quello entro +-span_bins: un modo vicino piu' alto non lo sostituisce)
+        f0 = peak["freq"]
+        span = span_bins
+        while True:
+            freqs, mags = zoom_band(centered, fs, max(f0 - span * df, 0.0), f0 + span * df, points, backend)
+            f_ref, mag_ref, f1, f2 = _half_power(freqs, mags, f0, span_bins * df)
+            if f1 is not None or span >= span_bins * MAX_WIDEN:
+                break
+            span *= 2
+
+        # 2. griglia proporzionata alla banda a -3dB (+-0.75 larghezze: i punti a -3dB restano dentro)
+        if f1 is not None and f2 - f1 > lobe:
+            center, half_span = (f1 + f2) / 2, 0.75 * (f2 - f1)
+            freqs, mags = zoom_band(centered, fs, max(center - half_span, 0.0), center + half_span,
+                                    points, backend)
+            fine = _half_power(freqs, mags, center, half_span)
+            if fine[2] is not None:
+                f_ref, mag_ref, f1, f2 = fine
+
+        damping = None
+        if f1 is not None and f2 - f1 > lobe and f_ref > 0:
+            damping = round((f2 - f1) / (2 * f_ref) * 100, 2)
+
+        refined.append({"freq": round(f_ref, 4), "mag": round(mag_ref, 4), "damping": damping})
+
+    return refined
@@ -0,0 +1,72 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from metrics.fft_iterativa import resolve_backend
+
+
+"""
+    utils.spectral_features
+    Grandezze dello spettro condivise da get_top_peaks_prominence e get_top_peaks_resolution.
+
+    Magnitudi e asse delle frequenze (sole frequenze positive), media, deviazione standard e soglia
+    del rumore di fondo vengono calcolati una volta per acquisizione:
+        - con numpy (vettoriale) se disponibile
+        - altrimenti in un'unica passata in python (algoritmo di Welford per media e varianza),
+          invece di statistics.mean / statistics.stdev che lavorano con frazioni esatte
+
+    Functions
+    ---------
+    compute_features(fft_res, fs, backend="auto"):
+        restituisce un dict con n, magnitudes, frequencies, mean, std, threshold
+
+    Note
+    -----
+    -   std e' la deviazione standard campionaria (n-1), come statistics.stdev
+    -   threshold = mean + 2 * std (soglia minima per non prendere il rumore di fondo)
+    -   magnitudes e frequencies sono sempre liste, anche con il backend numpy
+"""
+
+
+def compute_features(fft_res, fs, backend="auto"):
+    """
+        Params:
+            - fft_res: risultato grezzo della FFT (n numeri complessi, layout di start_fft)
+            - fs: frequenza di campionamento
+            - backend: "auto", "numpy" o "python"
+        Returns:
+            - dict {"n", "magnitudes", "frequencies", "mean", "std", "threshold"}
+    """
+    n = len(fft_res)
+    half_len = n // 2
+    df = fs / n
+
+    if resolve_backend(backend) == "numpy":
+        mags = np.abs(np.asarray(fft_res[:half_len], dtype=complex))
+        avg = float(mags.mean())
+        std = float(mags.std(ddof=1))
+        magnitudes = mags.tolist()
+    else:
+        # Welford: media e varianza nella stessa passata del calcolo dei moduli
+        magnitudes = []
+        avg = 0.0
+        m2 = 0.0
+        for count, c in enumerate(fft_res[:half_len], 1):
+            mag = abs(c)
+            magnitudes.append(mag)
+            delta = mag - avg
+            avg += delta / count
+            m2 += delta * (mag - avg)
+        std = math.sqrt(m2 / (half_len - 1))
+
+    return {
+        "n": n,
+        "magnitudes": magnitudes,
+        "frequencies": [i * df for i in range(half_len)],
+        "mean": avg,
+        "std": std,
+        "threshold": avg + 2 * std,
+    }
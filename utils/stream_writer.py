@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+
+
+"""
+    utils.stream_writer:
+        Gestore delle scritture degli stream D1/D2/D3 su file.
+        - un handle bufferizzato per ogni sensore attivo (niente open/stat per ogni pacchetto)
+        - le scritture vengono accumulate in memoria e scaricate su disco al superamento
+          di una soglia di dimensione o di tempo
+        - numero massimo di descrittori aperti: oltre il limite viene chiuso (dopo flush)
+          l'handle usato meno di recente (LRU), lo stream resta registrato e viene riaperto in append
+
+    I dati possono essere str (file .log) o bytes (file .bin): internamente si scrive sempre in binario.
+"""
+
+
+class _Stream:
+    def __init__(self, path):
+        self.path = path
+        self.chunks = []                        # scritture in attesa di flush
+        self.size = 0                           # byte in buffer
+        self.last_flush = time.monotonic()
+
+
+class StreamWriterManager:
+    def __init__(self, max_open=16, flush_bytes=16384, flush_interval=2.0):
+        self.max_open = max_open                # descrittori aperti contemporaneamente
+        self.flush_bytes = flush_bytes          # soglia di flush per dimensione
+        self.flush_interval = flush_interval    # soglia di flush per tempo (s)
+
+        self._streams = {}                      # addr -> _Stream
+        self._handles = OrderedDict()           # addr -> file handle (ordine LRU)
+
+    def open(self, addr, path, truncate=True):
+        """
+            Registra lo stream di un sensore.
+            Se esiste gia' uno stream per addr viene prima chiuso (flush incluso).
+        """
+        self.close(addr)
+        self._streams[addr] = _Stream(path)
+        if truncate:
+            self._get_handle(addr).truncate(0)
+
+    def is_open(self, addr):
+        return addr in self._streams
+
+    def path(self, addr):
+        stream = self._streams.get(addr)
+        return stream.path if stream else None
+
+    def write(self, addr, data):
+        """
+            Accoda i dati nel buffer del sensore, flush se superata una soglia.
+            Returns: False se non esiste uno stream aperto per addr
+        """
+        stream = self._streams.get(addr)
+        if stream is None:
+            return False
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        stream.chunks.append(data)
+        stream.size += len(data)
+
+        if stream.size >= self.flush_bytes or time.monotonic() - stream.last_flush >= self.flush_interval:
+            self.flush(addr)
+        return True
+
+    def flush(self, addr):
+        """ Scarica su disco il buffer di un sensore """
+        stream = self._streams.get(addr)
+        if stream is None:
+            return
+        if stream.chunks:
+            f = self._get_handle(addr)
+            f.write(b''.join(stream.chunks))
+            f.flush()
+            stream.chunks = []
+            stream.size = 0
+        stream.last_flush = time.monotonic()
+
+    def flush_expired(self):
+        """ Flush degli stream con dati in buffer piu' vecchi di flush_interval (da chiamare nel loop) """
+        now = time.monotonic()
+        for addr, stream in list(self._streams.items()):
+            if stream.chunks and now - stream.last_flush >= self.flush_interval:
+                self.flush(addr)
+
+    def close(self, addr):
+        """ Flush e chiusura dello stream di un sensore (fine stream o chiusura anomala) """
+        if addr not in self._streams:
+            return
+        try:
+            self.flush(addr)
+        finally:
+            self._release_handle(addr)
+            self._streams.pop(addr, None)
+
+    def close_all(self):
+        for addr in list(self._streams):
+            self.close(addr)
+
+    def _get_handle(self, addr):
+        f = self._handles.get(addr)
+        if f is not None:
+            self._handles.move_to_end(addr)
+            return f
+
+        # limite descrittori: chiudo il meno recente
+        while len(self._handles) >= self.max_open:
+            old_addr = next(iter(self._handles))
+            self.flush(old_addr)
+            self._release_handle(old_addr)
+
+        f = open(self._streams[addr].path, 'ab')
+        self._handles[addr] = f
+        return f
+
+    def _release_handle(self, addr):
+        f = self._handles.pop(addr, None)
+        if f is not None:
+            f.close()
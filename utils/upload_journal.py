@@ -0,0 +1,117 @@
+import json
+import os
+
+
+"""
+    utils.upload_journal:
+        Registro persistente dei file da inviare e del loro stato per ogni sink (ftp, fastapi).
+        Sostituisce le sole code in memoria: dopo un riavvio le code vengono ricostruite dal registro
+        e il cleanup di un sensore e' una ricerca nell'indice, senza scansione della cartella dati.
+
+    Formato: file JSON lines append-only, un evento per riga
+        {"op": "add", "addr": "...", "file": "...", "sinks": ["ftp", "fastapi"]}   file accodato
+        {"op": "done", "file": "...", "sink": "ftp"}                               inviato a un sink
+        {"op": "forget", "file": "..."}                                            file rimosso
+    All'apertura gli eventi vengono riapplicati in ordine (una riga troncata da uno spegnimento
+    viene ignorata) e il registro viene compattato con i soli file ancora presenti.
+"""
+
+COMPACT_EVERY = 5000                    # eventi scritti oltre i quali il registro viene compattato
+
+
+class UploadJournal:
+    def __init__(self, path):
+        self.path = path
+        self._files = {}                # file -> {"addr": ..., "pending": [sink, ...]} (ordine di arrivo)
+        self._by_addr = {}              # addr -> {file: None} (dict usato come insieme ordinato)
+        self._events = 0                # righe scritte dall'ultima compattazione
+
+        self._load()
+        self.compact()
+
+    def add(self, addr, filename, sinks):
+        """ Registra il file in coda per i sink indicati (unione se gia' presente) """
+        entry = self._files.get(filename)
+        new_sinks = [s for s in sinks if entry is None or s not in entry["pending"]]
+        if entry is not None and not new_sinks:
+            return
+        self._apply({"op": "add", "addr": addr, "file": filename, "sinks": list(sinks)})
+        self._append({"op": "add", "addr": addr, "file": filename, "sinks": list(sinks)})
+
+    def done(self, filename, sink):
+        """ Segna il file come inviato al sink """
+        entry = self._files.get(filename)
+        if entry is None or sink not in entry["pending"]:
+            return
+        self._apply({"op": "done", "file": filename, "sink": sink})
+        self._append({"op": "done", "file": filename, "sink": sink})
+
+    def forget(self, filename):
+        """ Il file e' stato rimosso dal disco: esce dal registro """
+        if filename not in self._files:
+            return
+        self._apply({"op": "forget", "file": filename})
+        self._append({"op": "forget", "file": filename})
+
+    def files(self, addr):
+        """ File registrati per il sensore (ordine di arrivo) """
+        return list(self._by_addr.get(addr, ()))
+
+    def tracked(self):
+        """ Tutti i file registrati """
+        return list(self._files)
+
+    def pending(self, sink):
+        """ Returns: dict addr -> lista dei file in attesa per il sink (per ricostruire le code) """
+        queues = {}
+        for filename, entry in self._files.items():
+            if sink in entry["pending"]:
+                queues.setdefault(entry["addr"], []).append(filename)
+        return queues
+
+    def compact(self):
+        """ Riscrive il registro con un evento "add" per ogni file presente (scrittura atomica) """
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for filename, entry in self._files.items():
+                f.write(json.dumps({"op": "add", "addr": entry["addr"], "file": filename,
+                                    "sinks": entry["pending"]}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._events = 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError):
+                    continue            # riga incompleta (spegnimento durante la scrittura)
+
+    def _apply(self, event):
+        op = event["op"]
+        filename = event["file"]
+        if op == "add":
+            entry = self._files.setdefault(filename, {"addr": event["addr"], "pending": []})
+            for sink in event["sinks"]:
+                if sink not in entry["pending"]:
+                    entry["pending"].append(sink)
+            self._by_addr.setdefault(entry["addr"], {})[filename] = None
+        elif op == "done":
+            entry = self._files.get(filename)
+            if entry is not None and event["sink"] in entry["pending"]:
+                entry["pending"].remove(event["sink"])
+        elif op == "forget":
+            entry = self._files.pop(filename, None)
+            if entry is not None:
+                self._by_addr.get(entry["addr"], {}).pop(filename, None)
+
+    def _append(self, event):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+        self._events += 1
+        if self._events >= COMPACT_EVERY:
+            self.compact()
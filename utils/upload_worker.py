@@ -0,0 +1,100 @@
+import queue
+import threading
+
+
+"""
+    utils.upload_worker:
+        Worker di upload per un sink (FastAPI, FTP): un thread con la propria coda di invii.
+        Il loop radio accoda gli invii e prosegue, gli esiti tornano su una coda di risultati
+        condivisa che il gateway svuota nel loop principale (code dei file e cleanup restano
+        gestiti da un solo thread).
+
+    Con batch_fn gli invii accodati mentre il worker era occupato (es. raffica di A1 da piu' sensori)
+    vengono eseguiti insieme con una sola chiamata.
+
+    Esito di un invio: (sink, batch_id, addr, uploaded, logs)
+        - uploaded: file inviati con successo
+        - logs: messaggi per history.log prodotti durante l'invio (scritti dal loop principale)
+"""
+
+
+class UploadWorker:
+    def __init__(self, sink, upload_fn, results, threaded=True, batch_fn=None):
+        """
+            Params:
+                - sink: nome del sink ("fastapi", "ftp")
+                - upload_fn: upload_fn(addr, files, context, logger_callback) -> lista dei file inviati
+                - results: queue.Queue condivisa su cui pubblicare gli esiti
+                - threaded: False esegue gli invii subito, nel thread chiamante
+                - batch_fn: batch_fn(tasks, logger_callback) -> dict batch_id -> file inviati,
+                  tasks = lista di (batch_id, addr, files, context)
+        """
+        self.sink = sink
+        self.upload_fn = upload_fn
+        self.results = results
+        self.threaded = threaded
+        self.batch_fn = batch_fn
+
+        self._tasks = queue.Queue()
+        self._thread = None
+        if threaded:
+            self._thread = threading.Thread(target=self._loop, name=f"upload-{sink}", daemon=True)
+            self._thread.start()
+
+    def submit(self, batch_id, addr, files, context=None):
+        """ Accoda l'invio di files (copia della coda del sensore) """
+        task = (batch_id, addr, list(files), context)
+        if self.threaded:
+            self._tasks.put(task)
+        else:
+            self._execute(task)
+
+    def stop(self, timeout=5.0):
+        """ Ferma il thread dopo gli invii gia' accodati (attesa massima timeout) """
+        if self._thread is not None:
+            self._tasks.put(None)
+            self._thread.join(timeout)
+
+    def _loop(self):
+        running = True
+        while running:
+            task = self._tasks.get()
+            if task is None:
+                break
+
+            tasks = [task]
+            while self.batch_fn is not None:                    # invii accumulati nel frattempo
+                try:
+                    task = self._tasks.get_nowait()
+                except queue.Empty:
+                    break
+                if task is None:
+                    running = False
+                    break
+                tasks.append(task)
+
+            if len(tasks) == 1:
+                self._execute(tasks[0])
+            else:
+                self._execute_batch(tasks)
+
+    def _execute(self, task):
+        batch_id, addr, files, context = task
+        logs = []
+        try:
+            uploaded = self.upload_fn(addr, files, context, logs.append) or []
+        except Exception as e:
+            logs.append(f"\t[CRITICAL][{self.sink}] Errore: {str(e)}\n")
+            uploaded = []
+        self.results.put((self.sink, batch_id, addr, list(uploaded), logs))
+
+    def _execute_batch(self, tasks):
+        logs = []
+        try:
+            uploaded = self.batch_fn(tasks, logs.append)
+        except Exception as e:
+            logs.append(f"\t[CRITICAL][{self.sink}] Errore: {str(e)}\n")
+            uploaded = {}
+        for i, (batch_id, addr, _, _) in enumerate(tasks):
+            # i log del batch accompagnano il primo esito
+            self.results.put((self.sink, batch_id, addr, list(uploaded.get(batch_id, [])), logs if i == 0 else []))